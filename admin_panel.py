@@ -1,5 +1,6 @@
 import streamlit as st
 from database import get_users, get_statistics
+from services import profiling
 
 def render_admin_panel(supabase):
     st.header("⚙️ Panel de administrador")
@@ -22,3 +23,33 @@ def render_admin_panel(supabase):
                 if st.button(f"Promover {u['email']} a admin", key=f"admin_{u['id']}"):
                     supabase.table("users").update({"role":"admin"}).eq("id", u["id"]).execute()
                     st.session_state['update'] = True
+
+    st.markdown("---")
+    render_profiling_panel()
+
+def render_profiling_panel():
+    st.subheader("⏱️ Perfilado de reruns")
+    # Solo se cambia el modo al pulsar: el estado del widget de otra sesión no lo pisa
+    st.toggle("Perfilar cada rerun", value=profiling.is_enabled(), key="perfilado_activo",
+              on_change=lambda: profiling.set_enabled(st.session_state.perfilado_activo),
+              help="Afecta a todas las sesiones de este worker; se aplica desde el siguiente rerun")
+    perfiles = profiling.profiles.list()
+    if not perfiles:
+        st.info("No hay perfiles capturados")
+        return
+    # Más reciente primero
+    perfiles.reverse()
+    idx = st.selectbox("Perfil", range(len(perfiles)), format_func=lambda i: perfiles[i].label,
+                       key="perfil_seleccionado")
+    perfil = perfiles[idx]
+    if perfil.tabs:
+        st.caption(" · ".join(f"{tab}: {s * 1000:.0f} ms" for tab, s in perfil.tabs.items()))
+    st.table(perfil.summary())
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("Descargar perfil (.prof)", perfil.dump(),
+                           file_name=f"preitv_{perfil.page}_{int(perfil.ts)}.prof",
+                           mime="application/octet-stream")
+    with col2:
+        if st.button("Vaciar perfiles"):
+            profiling.profiles.clear()
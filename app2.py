@@ -6,6 +6,11 @@ from utils.helpers import (
     resumen_proximos_mantenimientos,
     ciudades_coords
 )
+from services.pipeline import plan_route, FUEL_TYPES
+from services.fuel_index import cheapest_near_city
+from services.history import HistoryStore, RouteRecord, SupabaseHistoryBackend, PAGE_SIZE
+from services.profiling import profile_rerun, profile_tab
+from admin_panel import render_profiling_panel
 from io import BytesIO
 from PIL import Image
 import base64
@@ -27,7 +32,9 @@ if "user_email" not in st.session_state:
 if "user_name" not in st.session_state:
     st.session_state.user_name = ""
 if "historial" not in st.session_state:
-    st.session_state.historial = []
+    st.session_state.historial = HistoryStore()
+if "historial_pagina" not in st.session_state:
+    st.session_state.historial_pagina = 1
 if "logo_base64" not in st.session_state:
     st.session_state.logo_base64 = None
 if "role" not in st.session_state:
@@ -90,6 +97,8 @@ def render_admin_panel():
     # Logo
     st.subheader("🖼️ Logo de la web")
     upload_logo()
+    st.markdown("---")
+    render_profiling_panel()
 
 # -----------------------------
 # Login lateral
@@ -111,6 +120,11 @@ with st.sidebar:
                     st.session_state.role = user_data.data[0].get("role", "user")
             except Exception:
                 st.error("Error al iniciar sesión")
+            else:
+                try:
+                    st.session_state.historial = HistoryStore(SupabaseHistoryBackend(supabase, user.user.id))
+                except Exception as e:
+                    st.warning(f"No se pudo cargar el historial guardado: {e}")
     else:
         st.write(f"👋 Hola {st.session_state.user_name}")
         if st.button("Cerrar sesión"):
@@ -132,54 +146,114 @@ st.markdown("## 🚗 PreITV")
 # Contenedor principal
 # -----------------------------
 main_container = st.container()
-with main_container:
+# Con el perfilado activo (panel de administrador) se captura cada rerun
+with main_container, profile_rerun("app2", st.session_state.role):
     if st.session_state.user_logged_in and st.session_state.role == "admin":
-        render_admin_panel()
+        with profile_tab("Administrador"):
+            render_admin_panel()
 
     tabs = st.tabs(["Vehículos", "Rutas"] + (["Historial"] if st.session_state.user_logged_in else []))
     
     # -----------------------------
     # Tab Vehículos
     # -----------------------------
-    with tabs[0]:
+    with tabs[0], profile_tab("Vehículos"):
         st.header("Vehículos")
         st.write("Aquí iría el buscador de vehículos y recomendaciones ITV")
     
     # -----------------------------
     # Tab Rutas
     # -----------------------------
-    with tabs[1]:
+    with tabs[1], profile_tab("Rutas"):
         st.header("🗺️ Planificador de rutas")
         origen = st.selectbox("Ciudad de origen", list(ciudades_coords.keys()))
         destino = st.selectbox("Ciudad de destino", list(ciudades_coords.keys()))
         consumo = st.number_input("Consumo medio (L/100km)", min_value=1.0, value=5.5)
         precio_comb = st.number_input("Precio combustible (€/L)", min_value=0.5, value=1.9)
+        combustible = st.selectbox("Combustible", FUEL_TYPES)
+        planificar = st.checkbox("Planificar repostajes")
+        if planificar:
+            deposito = st.number_input("Capacidad del depósito (L)", min_value=10.0, value=50.0)
+            litros_iniciales = st.number_input("Litros al salir", min_value=0.0, max_value=deposito, value=deposito / 2)
         if st.button("Calcular ruta"):
             origen_coords = geocode_city(origen)
             destino_coords = geocode_city(destino)
             if origen_coords and destino_coords:
-                distancia = ((origen_coords[0]-destino_coords[0])**2 + (origen_coords[1]-destino_coords[1])**2)**0.5*111
-                duracion = distancia / 50  # suposición 50 km/h
-                consumo_total = distancia * consumo / 100
-                coste = consumo_total * precio_comb
-                st.markdown(f"**{origen} → {destino}** — {distancia:.1f} km — {duracion:.1f} h — {consumo_total:.1f} L — {coste:.2f} €")
-                # Guardado solo para usuarios logueados
-                if st.session_state.user_logged_in:
-                    st.session_state.historial.append({
-                        "origen": origen, "destino": destino, "distancia_km": distancia,
-                        "duracion": duracion, "consumo_l": consumo_total, "coste": coste
-                    })
+                # Ruta y precios se calculan a la vez; cada bloque se pinta al estar listo
+                resumen = st.empty()
+                gasolineras = st.empty()
+                repostajes = st.empty()
+                resumen.info("Calculando ruta...")
+                gasolineras.info("Buscando gasolineras en la ruta...")
+                for etapa, datos in plan_route(
+                    (origen_coords[1], origen_coords[0]), (destino_coords[1], destino_coords[0]),
+                    consumo, precio_comb, fuel_types=[combustible],
+                    tank_l=deposito if planificar else None,
+                    fuel_inicial_l=litros_iniciales if planificar else None
+                ):
+                    if etapa == "ruta":
+                        distancia = datos["distancia_km"]
+                        duracion = datos["duracion_min"] / 60
+                        consumo_total = datos["litros"]
+                        coste = datos["coste"]
+                        resumen.markdown(f"**{origen} → {destino}** — {distancia:.1f} km — {duracion:.1f} h — {consumo_total:.1f} L — {coste:.2f} €")
+                        # Guardado solo para usuarios logueados
+                        if st.session_state.user_logged_in:
+                            try:
+                                st.session_state.historial.add(RouteRecord(
+                                    origen, destino, distancia, duracion, consumo_total, coste,
+                                    geometria=datos["geometria"]
+                                ))
+                            except Exception as e:
+                                st.error(f"Error guardando ruta: {e}")
+                    elif etapa == "gasolineras":
+                        if datos[combustible]:
+                            gasolineras.table(datos[combustible])
+                        else:
+                            gasolineras.info("No hay gasolineras cerca de la ruta")
+                    elif etapa == "repostajes":
+                        if datos is None:
+                            repostajes.warning("No se llega al destino con esa autonomía y las gasolineras de la ruta")
+                        elif datos["paradas"]:
+                            with repostajes.container():
+                                st.markdown(f"**Repostajes:** {datos['litros_total']:.1f} L — {datos['coste_total']:.2f} €")
+                                st.table([
+                                    {"km": round(p["km"], 1), "rotulo": p["rotulo"], "municipio": p["municipio"],
+                                     "precio": p["precio"], "litros": p["litros"], "coste": p["coste"]}
+                                    for p in datos["paradas"]
+                                ])
+                        else:
+                            repostajes.info("No hace falta repostar")
+                    elif datos["etapa"] == "ruta":
+                        resumen.error(datos["mensaje"])
+                        gasolineras.empty()
+                    else:
+                        gasolineras.warning(datos["mensaje"])
+        with st.expander(f"⛽ Gasolineras más baratas en {origen}"):
+            baratas = cheapest_near_city(origen, combustible, radius_km=10)
+            if baratas:
+                st.table(baratas)
+            else:
+                st.info("Sin datos de precios para esta ciudad")
     
     # -----------------------------
     # Tab Historial (solo usuarios logueados)
     # -----------------------------
     if st.session_state.user_logged_in:
-        with tabs[2]:
+        with tabs[2], profile_tab("Historial"):
             st.header("📜 Historial de búsquedas")
-            if st.session_state.historial:
-                for i, r in enumerate(st.session_state.historial, start=1):
+            historial = st.session_state.historial
+            if len(historial):
+                # Solo se pinta una página; las antiguas se leen de Supabase al pedirlas
+                pagina = st.number_input(
+                    f"Página (de {historial.pages()})", min_value=1, max_value=historial.pages(),
+                    key="historial_pagina"
+                )
+                offset = (pagina - 1) * PAGE_SIZE
+                for j, r in enumerate(historial.page(pagina - 1), start=0):
+                    i = len(historial) - offset - j
                     st.markdown(
-                        f"**{i}. {r['origen']} → {r['destino']}** — {r['distancia_km']:.1f} km — {r['duracion']:.1f} h — {r['consumo_l']:.1f} L — {r['coste']:.2f} €"
+                        f"**{i}. {r.origen} → {r.destino}** — {r.distancia_km:.1f} km — {r.duracion:.1f} h — {r.consumo_l:.1f} L — {r.coste:.2f} €"
                     )
             else:
                 st.info("Aún no hay búsquedas guardadas.")
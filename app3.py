@@ -6,9 +6,10 @@ from utils.helpers import (
     resumen_proximos_mantenimientos,
     geocode_city,
 )
-from utils.ciudades_coords import ciudades_coords
-from utils.database import supabase_client
+from utils.cities import ciudades_coords
+from services.supabase_client import supabase as supabase_client
 from admin_panel import render_admin_panel
+from services.profiling import profile_rerun, profile_tab
 
 # -----------------------------
 # Configuración inicial
@@ -30,7 +31,9 @@ def login_sidebar():
     if st.sidebar.button("Iniciar sesión"):
         user = supabase_client.auth.sign_in_with_password({"email": email, "password": password})
         if user:
-            st.session_state['user'] = user
+            st.session_state['user'] = user.user.model_dump()
+            user_data = supabase_client.table("users").select("role").eq("email", email).execute()
+            st.session_state['role'] = user_data.data[0].get("role", "user") if user_data.data else "user"
             st.success(f"Bienvenido {email}")
         else:
             st.error("Usuario o contraseña incorrecta")
@@ -56,13 +59,14 @@ def render_main_app():
         st.info("Puedes explorar la app, pero para guardar búsquedas debes iniciar sesión.")
     else:
         user = st.session_state['user']
-        tabs = ["Vehículos", "Rutas", "Historial de búsquedas", "Panel de usuario", "Panel administrador"]
+        es_admin = st.session_state.get('role') == "admin"
+        tabs = ["Vehículos", "Rutas", "Historial de búsquedas", "Panel de usuario"] + (["Panel administrador"] if es_admin else [])
         selected_tab = st.tabs(tabs)
 
         # -----------------------------
         # Tab Vehículos
         # -----------------------------
-        with selected_tab[0]:
+        with selected_tab[0], profile_tab("Vehículos"):
             st.header("🚗 Vehículos")
             marca = st.selectbox("Marca", ["Seat", "Volkswagen", "Renault"])
             modelo = st.text_input("Modelo")
@@ -77,7 +81,7 @@ def render_main_app():
         # -----------------------------
         # Tab Rutas
         # -----------------------------
-        with selected_tab[1]:
+        with selected_tab[1], profile_tab("Rutas"):
             st.header("🗺️ Planificador de ruta y coste")
             origen = st.selectbox("Ciudad de origen", list(ciudades_coords.keys()))
             destino = st.selectbox("Ciudad de destino", list(ciudades_coords.keys()))
@@ -100,7 +104,7 @@ def render_main_app():
         # -----------------------------
         # Tab Historial de búsquedas
         # -----------------------------
-        with selected_tab[2]:
+        with selected_tab[2], profile_tab("Historial"):
             st.header("📜 Historial de búsquedas")
             historial = supabase_client.table("routes").select("*").eq("user_id", user['id']).execute()
             st.table(historial.data if historial.data else [])
@@ -108,18 +112,20 @@ def render_main_app():
         # -----------------------------
         # Tab Panel de usuario
         # -----------------------------
-        with selected_tab[3]:
+        with selected_tab[3], profile_tab("Panel de usuario"):
             st.header(f"👋 Hola, {user['email']}")
             if st.button("Cerrar sesión"):
                 logout()
 
         # -----------------------------
-        # Tab Administrador
+        # Tab Administrador (solo rol admin)
         # -----------------------------
-        with selected_tab[4]:
-            render_admin_panel(supabase_client)
+        if es_admin:
+            with selected_tab[4], profile_tab("Administrador"):
+                render_admin_panel(supabase_client)
 
 # -----------------------------
 # Ejecutar app
 # -----------------------------
-render_main_app()
+with profile_rerun("app3", st.session_state.get('role') or "user"):
+    render_main_app()
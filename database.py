@@ -8,7 +8,7 @@ def get_supabase_client():
 
 def get_users(supabase: Client):
     res = supabase.table("users").select("*").execute()
-    return res.data if not res.error else []
+    return res.data or []
 
 def get_statistics(supabase: Client):
     users_count = supabase.table("users").select("id", count="exact").execute().count
@@ -0,0 +1,74 @@
+# Prueba de carga de route_api.py contra los stubs locales de OSRM y MITECO.
+#
+#   python -m loadtest.api_load --concurrency 50 --requests 500
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from loadtest.stubs import osrm_stub, miteco_stub
+
+PAIRS = [("Madrid", "Zaragoza"), ("Madrid", "Barcelona"), ("Sevilla", "Málaga"), ("Bilbao", "Burgos")]
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+async def run(base_url, concurrency, total):
+    import httpx
+    latencies = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        async def one(i):
+            nonlocal errors
+            origen, destino = PAIRS[i % len(PAIRS)]
+            path = "/gasolineras" if i % 2 else "/ruta"
+            async with sem:
+                t = time.perf_counter()
+                res = await client.get(path, params={"origen": origen, "destino": destino})
+                latencies.append(time.perf_counter() - t)
+                if res.status_code != 200:
+                    errors += 1
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - t0
+    return latencies, errors, elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--osrm-latency", type=float, default=0.05)
+    parser.add_argument("--miteco-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    osrm = osrm_stub(args.osrm_latency).start()
+    miteco = miteco_stub(args.miteco_latency).start()
+    os.environ["PREITV_OSRM_URL"] = osrm.url
+    os.environ["PREITV_MITECO_URL"] = miteco.url
+    # El índice de gasolineras se regenera con cada instantánea: que no pise data/
+    os.environ["PREITV_FUEL_INDEX_FILE"] = os.path.join(tempfile.mkdtemp(), "cheapest_fuel.json")
+
+    import uvicorn
+    import route_api
+    server = uvicorn.Server(uvicorn.Config(route_api.app, host="127.0.0.1", port=8765, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    latencies, errors, elapsed = asyncio.run(run("http://127.0.0.1:8765", args.concurrency, args.requests))
+    server.should_exit = True
+
+    print(f"peticiones: {len(latencies)}  errores: {errors}  tiempo: {elapsed:.2f} s  "
+          f"rps: {len(latencies) / elapsed:.1f}")
+    print(f"latencia p50 {percentile(latencies, 50) * 1000:.0f} ms  p95 {percentile(latencies, 95) * 1000:.0f} ms  "
+          f"p99 {percentile(latencies, 99) * 1000:.0f} ms  media {statistics.mean(latencies) * 1000:.0f} ms")
+    print(f"llamadas upstream: OSRM {sum(osrm.hits.values())}  MITECO {sum(miteco.hits.values())}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+# Prueba de carga multi-sesión de las apps Streamlit (app2.py, app3.py)
+#
+# Arranca stubs locales de OSRM, MITECO, FIPE y Supabase y, por escenario, un
+# servidor real `streamlit run` de la app. Abre N sesiones concurrentes por
+# websocket con el mismo protocolo que el navegador (BackMsg/ForwardMsg) y
+# cada una recorre login, ruta, vehículo e historial en bucle a la vez que
+# las demás: todas comparten el proceso del servidor, sus cachés y su GIL.
+# Se mide la latencia de cada interacción, las interacciones/s que atiende
+# el servidor y su memoria.
+#
+#   python -m loadtest.harness --app app2.py --sessions 1 5 10 20
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from loadtest.stubs import osrm_stub, miteco_stub, fipe_stub, SupabaseStub
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+STEPS = ("inicio", "login", "ruta", "vehiculo", "historial")
+# Widgets cuyo valor se puede fijar desde la sesión simulada
+WIDGET_TYPES = ("button", "checkbox", "selectbox", "text_input", "number_input")
+RERUN_TIMEOUT_S = 120
+SERVER_START_TIMEOUT_S = 60
+
+def rss_mb(pid):
+    """Memoria residente actual del proceso pid en MB."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] if values else 0.0
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# -----------------------------
+# Servidor Streamlit
+# -----------------------------
+def start_server(app, env, log_dir):
+    """
+    Lanza `streamlit run app` en un puerto libre y espera a que responda.
+    --secrets.files no admite listas desde la línea de comandos, así que el
+    servidor usa un HOME temporal con .streamlit/secrets.toml.
+    """
+    port = _free_port()
+    log = open(os.path.join(log_dir, f"{os.path.splitext(app)[0]}_{port}.log"), "w")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", os.path.join(BASE_DIR, app),
+         "--server.headless", "true", "--server.port", str(port), "--server.fileWatcherType", "none",
+         "--browser.gatherUsageStats", "false", "--logger.level", "error"],
+        cwd=BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    deadline = time.time() + SERVER_START_TIMEOUT_S
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"streamlit terminó al arrancar, ver {log.name}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1):
+                return proc, port, log.name
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"streamlit no respondió en {SERVER_START_TIMEOUT_S} s, ver {log.name}")
+
+class Session:
+    """
+    Sesión de navegador simulada: envía reruns con el estado de los widgets
+    y lee los ForwardMsg hasta el final del script, guardando los widgets y
+    excepciones del último rerun.
+    """
+
+    def __init__(self, port):
+        self.url = f"ws://127.0.0.1:{port}/_stcore/stream"
+        self.ws = None
+        self.values = {}
+        self.widgets = {}
+        self.exceptions = []
+        self._cache = {}
+
+    async def connect(self):
+        from tornado.websocket import websocket_connect
+        self.ws = await websocket_connect(self.url, subprotocols=["streamlit"], max_message_size=256 * 2**20)
+
+    def close(self):
+        if self.ws is not None:
+            self.ws.close()
+
+    def widget(self, label=None, key=None):
+        """(tipo, proto) del widget por etiqueta o por key de Streamlit."""
+        for (wtype, wlabel), (_, proto) in self.widgets.items():
+            if (label is not None and wlabel == label) or (key is not None and proto.id.endswith(f"-{key}")):
+                return wtype, proto
+        raise LookupError(f"widget no encontrado: {label or key}")
+
+    def set(self, label, value):
+        """Fija el valor de un widget para los reruns siguientes (como al editarlo)."""
+        wtype, proto = self.widget(label)
+        self._set(wtype, proto, value)
+
+    def _set(self, wtype, proto, value):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        state = WidgetState(id=proto.id)
+        if wtype == "text_input":
+            state.string_value = value
+        elif wtype == "checkbox":
+            state.bool_value = value
+        elif wtype == "selectbox":
+            state.int_value = list(proto.options).index(value)
+        elif wtype == "number_input":
+            if proto.data_type == proto.DataType.INT:
+                state.int_value = int(value)
+            else:
+                state.double_value = float(value)
+        self.values[proto.id] = state
+
+    async def rerun(self, click=None):
+        """Rerun con los valores fijados; click pulsa el botón con esa etiqueta."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        states = list(self.values.values())
+        if click is not None:
+            states.append(WidgetState(id=self.widget(click)[1].id, trigger_value=True))
+        msg.rerun_script.widget_states.widgets.extend(states)
+        await self.ws.write_message(msg.SerializeToString(), binary=True)
+        await asyncio.wait_for(self._read_until_finished(), RERUN_TIMEOUT_S)
+
+    async def _read_until_finished(self):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        while True:
+            raw = await self.ws.read_message()
+            if raw is None:
+                raise ConnectionError("el servidor cerró el websocket")
+            fmsg = ForwardMsg()
+            fmsg.ParseFromString(raw)
+            if fmsg.ref_hash:
+                # Mensaje ya enviado antes a esta sesión: el servidor solo manda su hash
+                fmsg = self._cache.get(fmsg.ref_hash, fmsg)
+            elif fmsg.hash:
+                self._cache[fmsg.hash] = fmsg
+            kind = fmsg.WhichOneof("type")
+            if kind == "new_session":
+                self.widgets = {}
+                self.exceptions = []
+            elif kind == "delta" and fmsg.delta.WhichOneof("type") == "new_element":
+                element = fmsg.delta.new_element
+                etype = element.WhichOneof("type")
+                if etype in WIDGET_TYPES:
+                    proto = getattr(element, etype)
+                    self.widgets[(etype, proto.label)] = (etype, proto)
+                elif etype == "exception":
+                    self.exceptions.append(f"{element.exception.type}: {element.exception.message}")
+            elif kind == "script_finished":
+                if fmsg.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    return
+
+# -----------------------------
+# Flujos por app
+# -----------------------------
+async def _login_app2(s, email, rnd):
+    s.set("Email", email)
+    s.set("Contraseña", "secreto")
+    await s.rerun(click="Entrar")
+
+async def _route_app2(s, email, rnd):
+    for label in ("Ciudad de origen", "Ciudad de destino"):
+        s.set(label, rnd.choice(s.widget(label)[1].options))
+    await s.rerun(click="Calcular ruta")
+
+async def _history_app2(s, email, rnd):
+    try:
+        wtype, proto = s.widget(key="historial_pagina")
+    except LookupError:
+        await s.rerun()
+        return
+    s._set(wtype, proto, rnd.randint(int(proto.min), int(proto.max)))
+    await s.rerun()
+
+async def _login_app3(s, email, rnd):
+    s.set("Email", email)
+    s.set("Contraseña", "secreto")
+    await s.rerun(click="Iniciar sesión")
+    # app3 solo pinta las pestañas en el rerun siguiente al login
+    await s.rerun()
+
+async def _route_app3(s, email, rnd):
+    await s.rerun(click="Calcular ruta")
+
+async def _vehicle_app3(s, email, rnd):
+    s.set("Marca", rnd.choice(s.widget("Marca")[1].options))
+    await s.rerun(click="Calcular recomendaciones")
+
+async def _rerun(s, email, rnd):
+    await s.rerun()
+
+FLOWS = {
+    "app2.py": {"login": _login_app2, "ruta": _route_app2, "vehiculo": _rerun, "historial": _history_app2},
+    "app3.py": {"login": _login_app3, "ruta": _route_app3, "vehiculo": _vehicle_app3, "historial": _rerun},
+}
+
+# -----------------------------
+# Sesiones
+# -----------------------------
+def new_stats():
+    return {"latencias": {name: [] for name in STEPS}, "errores": {}, "primer_error": {}}
+
+async def _step(session, action, email, rnd, stats, name):
+    """Ejecuta una interacción (con su rerun) y anota latencia y errores."""
+    t = time.perf_counter()
+    error = None
+    try:
+        await action(session, email, rnd)
+        if session.exceptions:
+            error = session.exceptions[0]
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    stats["latencias"][name].append(time.perf_counter() - t)
+    if error:
+        stats["errores"][name] = stats["errores"].get(name, 0) + 1
+        stats["primer_error"].setdefault(name, error)
+
+async def open_session(port, flows, email, rnd, stats):
+    """Conecta una sesión, pinta la app y hace login."""
+    session = Session(port)
+    await session.connect()
+    await _step(session, _rerun, email, rnd, stats, "inicio")
+    await _step(session, flows["login"], email, rnd, stats, "login")
+    return session
+
+async def run_flow(session, flows, email, rnd, stats, iterations):
+    for _ in range(iterations):
+        for name in ("ruta", "vehiculo", "historial"):
+            await _step(session, flows[name], email, rnd, stats, name)
+
+async def _sample_rss(pid, peak):
+    while True:
+        peak[0] = max(peak[0], rss_mb(pid))
+        await asyncio.sleep(0.2)
+
+async def run_sessions(port, pid, app, emails, iterations, seed):
+    """
+    Una sesión hace primero un flujo completo sin medir (carga la instantánea
+    de MITECO, las estaciones parseadas y el índice de gasolineras); la
+    memoria tras ella es la base. Después el resto se conecta y todas
+    recorren el flujo a la vez sobre el mismo servidor.
+    """
+    flows = FLOWS[app]
+    stats = new_stats()
+    rss_inicio = rss_mb(pid)
+    first = await open_session(port, flows, emails[0], random.Random(seed), stats)
+    stats["previas"] = sum(len(v) for v in stats["latencias"].values())
+    await run_flow(first, flows, emails[0], random.Random(seed), new_stats(), 1)
+    rss_una_sesion = rss_mb(pid)
+
+    peak = [rss_una_sesion]
+    sampler = asyncio.ensure_future(_sample_rss(pid, peak))
+    t0 = time.perf_counter()
+    rest = await asyncio.gather(*(
+        open_session(port, flows, email, random.Random(seed + i), stats) for i, email in enumerate(emails[1:], 1)
+    ))
+    sessions = [first] + list(rest)
+    await asyncio.gather(*(
+        run_flow(s, flows, email, random.Random(seed + i), stats, iterations)
+        for i, (s, email) in enumerate(zip(sessions, emails))
+    ))
+    stats["segundos"] = time.perf_counter() - t0
+    sampler.cancel()
+    stats["rss_inicio_mb"] = rss_inicio
+    stats["rss_una_sesion_mb"] = rss_una_sesion
+    stats["rss_fin_mb"] = rss_mb(pid)
+    stats["rss_pico_mb"] = max(peak[0], stats["rss_fin_mb"])
+    for s in sessions:
+        s.close()
+    return stats
+
+# -----------------------------
+# Orquestación
+# -----------------------------
+def run_scenario(app, sessions, iterations, supabase, env, log_dir):
+    emails = [f"user{i % len(supabase.tables['users'])}@preitv.test" for i in range(sessions)]
+    proc, port, log_path = start_server(app, env, log_dir)
+    try:
+        stats = asyncio.run(run_sessions(port, proc.pid, app, emails, iterations, seed=0))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    latencias, errores = stats["latencias"], stats["errores"]
+    # Solo la fase concurrente (sin el inicio y login de la primera sesión)
+    total = sum(len(v) for v in latencias.values()) - stats["previas"]
+    print(f"\n== {app}: {sessions} sesiones concurrentes en un servidor, {iterations} iteraciones ==")
+    print(f"interacciones: {total}  tiempo: {stats['segundos']:.1f} s  "
+          f"throughput: {total / stats['segundos']:.1f} interacciones/s")
+    print(f"{'paso':<10} {'n':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errores':>8}")
+    for name in STEPS:
+        values = latencias[name]
+        print(f"{name:<10} {len(values):>5} {percentile(values, 50) * 1000:>8.0f} "
+              f"{percentile(values, 95) * 1000:>8.0f} {percentile(values, 99) * 1000:>8.0f} {errores.get(name, 0):>8}")
+    extra = ""
+    if sessions > 1:
+        por_sesion = (stats["rss_fin_mb"] - stats["rss_una_sesion_mb"]) / (sessions - 1)
+        extra = f"  ({por_sesion:+.1f} MB por sesión adicional)"
+    print(f"servidor: RSS inicial {stats['rss_inicio_mb']:.0f} MB, tras 1 sesión {stats['rss_una_sesion_mb']:.0f} MB, "
+          f"pico {stats['rss_pico_mb']:.0f} MB, final {stats['rss_fin_mb']:.0f} MB{extra}")
+    for name, msg in stats["primer_error"].items():
+        print(f"primer error en {name}: {msg}")
+    if stats["primer_error"]:
+        print(f"log del servidor: {log_path}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--app", nargs="+", default=["app2.py", "app3.py"], choices=list(FLOWS))
+    parser.add_argument("--sessions", nargs="+", type=int, default=[1, 5, 10, 20])
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.05, help="latencia de cada stub (s)")
+    parser.add_argument("--stations", type=int, default=12000, help="estaciones en el stub de MITECO")
+    args = parser.parse_args()
+
+    osrm = osrm_stub(args.latency).start()
+    miteco = miteco_stub(args.latency, n=args.stations).start()
+    fipe = fipe_stub(args.latency).start()
+    supabase = SupabaseStub(users=max(args.sessions) + 1, latency_s=args.latency).start()
+
+    # El servidor solo habla con los stubs; secretos y ficheros generados van a un directorio temporal
+    work_dir = tempfile.mkdtemp(prefix="preitv_harness_")
+    os.makedirs(os.path.join(work_dir, ".streamlit"))
+    with open(os.path.join(work_dir, ".streamlit", "secrets.toml"), "w") as f:
+        f.write(f'SUPABASE_URL = "{supabase.url}"\nSUPABASE_KEY = "{supabase.key}"\n')
+    env = dict(os.environ, HOME=work_dir, PYTHONPATH=BASE_DIR,
+               PREITV_OSRM_URL=osrm.url, PREITV_MITECO_URL=miteco.url, PREITV_FIPE_URL=fipe.url,
+               PREITV_FUEL_INDEX_FILE=os.path.join(work_dir, "cheapest_fuel.json"))
+
+    for app in args.app:
+        for sessions in args.sessions:
+            run_scenario(app, sessions, args.iterations, supabase, env, work_dir)
+
+    print(f"\nllamadas upstream: OSRM {sum(osrm.hits.values())}  MITECO {sum(miteco.hits.values())}  "
+          f"FIPE {sum(fipe.hits.values())}  Supabase {sum(supabase.hits.values())}")
+
+if __name__ == "__main__":
+    main()
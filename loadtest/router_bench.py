@@ -0,0 +1,103 @@
+# Benchmark del motor de rutas local (services/local_router.py)
+#
+# Genera un grafo sintético reproducible sobre la península (rejilla con
+# velocidades mixtas y "autovías" cada pocas filas/columnas), lo preprocesa
+# con build_graph y mide el tiempo por consulta entre ciudades del catálogo.
+# Con --check compara cada duración con un Dijkstra completo.
+#
+#   python -m loadtest.router_bench --rows 400 --cols 600 --queries 50
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from services.local_router import LocalRouter, build_graph, _dijkstra_all, LANDMARKS
+
+BASE_DIR = os.path.join(os.path.dirname(__file__), "..")
+CITIES_FILE = os.path.join(BASE_DIR, "Utils", "ciudades_coords.json")
+PAIRS = [("Madrid", "Barcelona"), ("A Coruña", "Barcelona"), ("Cádiz", "Girona"), ("Sevilla", "Bilbao")]
+LAT_RANGE = (36.0, 43.8)
+LON_RANGE = (-9.3, 3.3)
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+def synthetic_graph(rows, cols, seed=0):
+    """Rejilla rows×cols con aristas en ambos sentidos; 40-90 km/h y 120 km/h en autovías."""
+    rng = np.random.default_rng(seed)
+    lats = np.linspace(*LAT_RANGE, rows)
+    lons = np.linspace(*LON_RANGE, cols)
+    nodes = [(lat, lon) for lat in lats for lon in lons]
+    km_lat = (lats[1] - lats[0]) * 111_000
+    edges = []
+    for r in range(rows):
+        km_lon = (lons[1] - lons[0]) * 111_320 * np.cos(np.radians(lats[r]))
+        for c in range(cols):
+            u = r * cols + c
+            for v, dist, highway in ((u + 1, km_lon, r % 25 == 0), (u + cols, km_lat, c % 25 == 0)):
+                if (v == u + 1 and c == cols - 1) or v >= rows * cols:
+                    continue
+                kmh = 120 if highway else rng.uniform(40, 90)
+                dur = dist / (kmh / 3.6)
+                edges.append((u, v, dist, dur))
+                edges.append((v, u, dist, dur))
+    return nodes, edges
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=400)
+    parser.add_argument("--cols", type=int, default=600)
+    parser.add_argument("--landmarks", type=int, default=LANDMARKS)
+    parser.add_argument("--queries", type=int, default=50, help="consultas entre ciudades al azar")
+    parser.add_argument("--check", action="store_true", help="comparar con Dijkstra (lento)")
+    parser.add_argument("--graph-dir", help="reutilizar un grafo ya generado")
+    args = parser.parse_args()
+
+    graph_dir = args.graph_dir or tempfile.mkdtemp(prefix="road_graph_")
+    if not os.path.exists(os.path.join(graph_dir, "meta.json")):
+        t = time.perf_counter()
+        nodes, edges = synthetic_graph(args.rows, args.cols)
+        build_graph(graph_dir, nodes, edges, landmarks=args.landmarks)
+        print(f"grafo: {len(nodes)} nodos, {len(edges)} aristas, {args.landmarks} landmarks "
+              f"en {time.perf_counter() - t:.1f} s ({graph_dir})")
+    router = LocalRouter(graph_dir)
+
+    with open(CITIES_FILE, encoding="utf-8") as f:
+        cities = json.load(f)
+    en_rejilla = [c for c, (lat, lon) in cities.items()
+                 if LAT_RANGE[0] <= lat <= LAT_RANGE[1] and LON_RANGE[0] <= lon <= LON_RANGE[1]]
+    rnd = random.Random(0)
+    pairs = PAIRS + [tuple(rnd.sample(en_rejilla, 2)) for _ in range(args.queries)]
+
+    queries = []
+    for origen, destino in pairs:
+        (lat_o, lon_o), (lat_d, lon_d) = cities[origen], cities[destino]
+        queries.append((origen, destino, router.nearest_node(lon_o, lat_o), router.nearest_node(lon_d, lat_d)))
+    # Pasada previa sin medir: carga en memoria las páginas del mmap, como en un worker ya arrancado
+    for *_, source, target in queries:
+        router.shortest_path(source, target)
+
+    times = []
+    for origen, destino, source, target in queries:
+        t = time.perf_counter()
+        nodes, edges = router.shortest_path(source, target)
+        elapsed = time.perf_counter() - t
+        times.append(elapsed)
+        duracion = sum(router._duration[e] for e in edges)
+        line = f"{origen} → {destino}: {elapsed * 1000:.1f} ms, {duracion / 3600:.2f} h, {len(nodes)} nodos"
+        if args.check:
+            ref = _dijkstra_all(router._offsets, router._targets, router._duration, source)[target]
+            line += f"  (Dijkstra {ref / 3600:.2f} h, dif {abs(ref - duracion):.3f} s)"
+        if (origen, destino) in PAIRS or args.check:
+            print(line)
+    print(f"\n{len(times)} consultas: p50 {percentile(times, 50) * 1000:.1f} ms  "
+          f"p95 {percentile(times, 95) * 1000:.1f} ms  máx {max(times) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
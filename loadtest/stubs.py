@@ -0,0 +1,262 @@
+# Servidores locales que imitan a los servicios externos (OSRM, MITECO)
+# para pruebas de carga reproducibles sin tocar los servicios reales.
+
+import base64
+import fnmatch
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+from services import polyline
+
+def _fmt(x, decimals):
+    """Número con coma decimal, como lo devuelve MITECO."""
+    return f"{x:.{decimals}f}".replace(".", ",")
+
+def fake_stations(n=12000, seed=0):
+    """Listado sintético de estaciones con el formato de MITECO."""
+    rnd = random.Random(seed)
+    stations = []
+    for i in range(n):
+        stations.append({
+            "Rótulo": f"Estación {i}",
+            "Dirección": f"Calle {i}",
+            "Municipio": "Municipio",
+            "Provincia": rnd.choice(["MADRID", "BARCELONA", "ZARAGOZA", "VALENCIA / VALÈNCIA"]),
+            "Latitud": _fmt(rnd.uniform(36.0, 43.7), 6),
+            "Longitud (WGS84)": _fmt(rnd.uniform(-9.2, 3.3), 6),
+            "Precio Gasolina 95 E5": _fmt(rnd.uniform(1.45, 1.85), 3),
+            "Precio Gasolina 98 E5": _fmt(rnd.uniform(1.60, 2.00), 3),
+            "Precio Gasoleo A": _fmt(rnd.uniform(1.35, 1.75), 3),
+            "Precio Gases licuados del petróleo": _fmt(rnd.uniform(0.85, 1.10), 3) if rnd.random() < 0.1 else "",
+        })
+    return stations
+
+def fake_osrm_route(lon_o, lat_o, lon_d, lat_d, points=2000, geometries="geojson"):
+    """Respuesta OSRM con una línea recta densificada entre origen y destino."""
+    coords = [[lon_o + (lon_d - lon_o) * t / points, lat_o + (lat_d - lat_o) * t / points]
+              for t in range(points + 1)]
+    distance = ((lon_d - lon_o)**2 + (lat_d - lat_o)**2)**0.5 * 111000 * 1.25
+    if geometries == "polyline6":
+        geometry = polyline.encode(coords, 6)
+    elif geometries == "polyline":
+        geometry = polyline.encode(coords, 5)
+    else:
+        geometry = {"type": "LineString", "coordinates": coords}
+    return {"code": "Ok", "routes": [{"distance": distance, "duration": distance / 25, "geometry": geometry}]}
+
+class StubServer:
+    """
+    Servidor HTTP en un hilo que responde con datos fijos.
+    - routes: {prefijo_de_ruta: función(path, query) -> objeto JSON} para GET
+    - latency_s: retardo añadido a cada respuesta
+    - error_rate: fracción de peticiones que responden 503
+    - slow_rate / slow_latency_s: fracción de peticiones con un retardo extra
+    Cuenta las peticiones recibidas por prefijo en `hits`. Las subclases
+    pueden redefinir respond() para otros métodos o cabeceras.
+    """
+
+    def __init__(self, routes, latency_s=0.0, error_rate=0.0, slow_rate=0.0, slow_latency_s=0.0, seed=0):
+        self.routes = routes
+        self.latency_s = latency_s
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency_s = slow_latency_s
+        self._rnd = random.Random(seed)
+        self.hits = {prefix: 0 for prefix in routes}
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.handle(self, "GET")
+
+            def do_POST(self):
+                stub.handle(self, "POST")
+
+            def do_PATCH(self):
+                stub.handle(self, "PATCH")
+
+            def do_DELETE(self):
+                stub.handle(self, "DELETE")
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def respond(self, method, path, query, body, headers):
+        """Devuelve (status, objeto JSON, cabeceras extra) o None si no hay ruta."""
+        prefix = next((p for p in self.routes if path.startswith(p)), None)
+        if method != "GET" or prefix is None:
+            return None
+        return 200, self.routes[prefix](path, query), {}
+
+    def handle(self, req, method="GET"):
+        url = urlsplit(req.path)
+        path = url.path
+        length = int(req.headers.get("Content-Length") or 0)
+        body = json.loads(req.rfile.read(length) or b"null") if length else None
+        key = next((p for p in self.hits if path.startswith(p)), path)
+        with self._lock:
+            self.hits[key] = self.hits.get(key, 0) + 1
+            fail = self._rnd.random() < self.error_rate
+            slow = self._rnd.random() < self.slow_rate
+        delay = self.latency_s + (self.slow_latency_s if slow else 0.0)
+        if delay:
+            time.sleep(delay)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        result = None if fail else self.respond(method, path, query, body, req.headers)
+        try:
+            if result is None:
+                req.send_error(503 if fail else 404)
+                return
+            status, obj, extra_headers = result
+            payload = json.dumps(obj).encode()
+            req.send_response(status)
+            req.send_header("Content-Type", "application/json")
+            req.send_header("Content-Length", str(len(payload)))
+            for name, value in extra_headers.items():
+                req.send_header(name, value)
+            req.end_headers()
+            req.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente abandonó la petición (deadline o petición hedged)
+            pass
+
+    def set_faults(self, error_rate=None, slow_rate=None, slow_latency_s=None):
+        """Cambia la inyección de fallos en caliente."""
+        if error_rate is not None:
+            self.error_rate = error_rate
+        if slow_rate is not None:
+            self.slow_rate = slow_rate
+        if slow_latency_s is not None:
+            self.slow_latency_s = slow_latency_s
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+
+def osrm_stub(latency_s=0.05):
+    def route(path, query):
+        # /route/v1/driving/lon,lat;lon,lat
+        a, b = path.rsplit("/", 1)[1].split(";")
+        return fake_osrm_route(*map(float, a.split(",")), *map(float, b.split(",")),
+                               geometries=query.get("geometries", "geojson"))
+    def table(path, query):
+        # /table/v1/driving/lon,lat;lon,lat;...  Canarias (lon < -13) sin ruta con el resto
+        points = [tuple(map(float, p.split(","))) for p in path.rsplit("/", 1)[1].split(";")]
+        distances = [[None if (lon_o < -13) != (lon_d < -13) else
+                      fake_osrm_route(lon_o, lat_o, lon_d, lat_d, points=1)["routes"][0]["distance"]
+                      for lon_d, lat_d in points] for lon_o, lat_o in points]
+        return {"code": "Ok", "distances": distances}
+    return StubServer({"/route/v1/driving/": route, "/table/v1/driving/": table}, latency_s)
+
+def miteco_stub(latency_s=0.5, n=12000):
+    payload = {"ListaEESSPrecio": fake_stations(n)}
+    return StubServer({"/": lambda path, query: payload}, latency_s)
+
+def fipe_stub(latency_s=0.05):
+    marcas = [{"nome": nome, "codigo": str(i)} for i, nome in enumerate(
+        ["Audi", "BMW", "Citroën", "Fiat", "Ford", "Peugeot", "Renault", "Seat", "Toyota", "VW - VolksWagen"], 1)]
+    modelos = {"modelos": [{"nome": f"Modelo {i}", "codigo": i} for i in range(40)], "anos": []}
+
+    def route(path, query):
+        return modelos if path.endswith("/modelos") else marcas
+    return StubServer({"/marcas": route}, latency_s)
+
+def _b64url(obj):
+    raw = json.dumps(obj, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+def fake_jwt(sub="anon", role="anon"):
+    """JWT sin firmar válido para el cliente de Supabase (no se verifica)."""
+    payload = {"sub": sub, "role": role, "exp": int(time.time()) + 3600, "aud": "authenticated"}
+    return f"{_b64url({'alg': 'HS256', 'typ': 'JWT'})}.{_b64url(payload)}.firma"
+
+class SupabaseStub(StubServer):
+    """
+    Imita lo que usan las apps de Supabase: login por contraseña
+    (/auth/v1/token) y tablas PostgREST en memoria (/rest/v1/<tabla>) con
+    filtros eq./like., order, Range y Prefer: count=exact.
+    """
+
+    def __init__(self, users=20, latency_s=0.02):
+        super().__init__({"/auth/v1/": None, "/rest/v1/": None}, latency_s)
+        self.tables = {
+            "users": [{"id": str(uuid.UUID(int=i)), "email": f"user{i}@preitv.test",
+                       "password": "secreto", "role": "admin" if i == 0 else "user"}
+                      for i in range(users)],
+            "searches": [], "vehiculos": [], "routes": [],
+        }
+        self.key = fake_jwt()
+
+    def respond(self, method, path, query, body, headers):
+        if path.startswith("/auth/v1/token"):
+            return self._login(body or {})
+        if path.startswith("/auth/v1/logout"):
+            return 204, {}, {}
+        if path.startswith("/rest/v1/"):
+            return self._rest(method, path.split("/")[3], query, body, headers)
+        return None
+
+    def _login(self, body):
+        user = next((u for u in self.tables["users"] if u["email"] == body.get("email")), None)
+        if user is None or body.get("password") != user["password"]:
+            return 400, {"error": "invalid_grant", "error_description": "Invalid login credentials"}, {}
+        auth_user = {"id": user["id"], "email": user["email"], "aud": "authenticated", "role": "authenticated",
+                     "app_metadata": {}, "user_metadata": {}, "created_at": "2025-01-01T00:00:00Z"}
+        return 200, {"access_token": fake_jwt(user["id"], "authenticated"), "token_type": "bearer",
+                     "expires_in": 3600, "expires_at": int(time.time()) + 3600,
+                     "refresh_token": uuid.uuid4().hex, "user": auth_user}, {}
+
+    def _rest(self, method, table, query, body, headers):
+        with self._lock:
+            rows = self.tables.setdefault(table, [])
+            if method == "POST":
+                new = body if isinstance(body, list) else [body]
+                for row in new:
+                    row.setdefault("id", len(rows) + 1)
+                    row.setdefault("created_at", time.time())
+                rows.extend(new)
+                return 201, new, {}
+            matched = [r for r in rows if self._matches(r, query)]
+            if method == "PATCH":
+                for r in matched:
+                    r.update(body or {})
+                return 200, matched, {}
+            if method == "DELETE":
+                self.tables[table] = [r for r in rows if r not in matched]
+                return 200, matched, {}
+        order = query.get("order")
+        if order:
+            column, _, direction = order.partition(".")
+            matched.sort(key=lambda r: r.get(column) or 0, reverse=direction.startswith("desc"))
+        total = len(matched)
+        start, end = 0, total - 1
+        if headers.get("Range"):
+            start, end = map(int, headers["Range"].split("-"))
+        page = matched[start:end + 1]
+        extra = {"Content-Range": f"{start}-{start + len(page) - 1}/{total}" if page else f"*/{total}"}
+        return 200, page, extra
+
+    @staticmethod
+    def _matches(row, query):
+        for column, cond in query.items():
+            if column in ("select", "order", "limit", "offset"):
+                continue
+            op, _, value = cond.partition(".")
+            if op == "eq" and str(row.get(column)) != value:
+                return False
+            if op == "like" and not fnmatch.fnmatchcase(str(row.get(column, "")), value.replace("%", "*")):
+                return False
+        return True
@@ -0,0 +1,81 @@
+# Comprueba services/upstream contra un stub local que inyecta latencia y
+# errores. Compara con llamadas directas a requests.get sin plazo.
+#
+#   python -m loadtest.upstream_faults
+
+import logging
+import time
+
+import requests
+
+from loadtest.stubs import StubServer
+from services.upstream import UpstreamClient, UpstreamError
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+def report(name, latencies, errors):
+    print(f"{name:<32} p50 {percentile(latencies, 50) * 1000:6.0f} ms  "
+          f"p99 {percentile(latencies, 99) * 1000:6.0f} ms  "
+          f"max {max(latencies) * 1000:6.0f} ms  errores {errors}")
+
+def run(call, n):
+    latencies, errors = [], 0
+    for _ in range(n):
+        t = time.perf_counter()
+        try:
+            call()
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - t)
+    return latencies, errors
+
+def main(n=200):
+    logging.getLogger().setLevel(logging.ERROR)
+    # 5% de respuestas tardan 2 s más; 3% fallan con 503
+    stub = StubServer({"/data": lambda path, query: {"ok": True}},
+                      latency_s=0.01, error_rate=0.03, slow_rate=0.05, slow_latency_s=2.0).start()
+    url = f"{stub.url}/data"
+
+    def direct():
+        res = requests.get(url)
+        res.raise_for_status()
+        return res.json()
+
+    report("requests.get (sin plazo)", *run(direct, n))
+
+    client = UpstreamClient(failure_threshold=5, reset_timeout_s=1)
+    report("UpstreamClient (hedged, 1 s)", *run(lambda: client.get_json(url, deadline_s=1.0), n))
+
+    # Caída total: el circuito se abre y se sirve la última respuesta buena
+    stub.set_faults(error_rate=1.0, slow_rate=0.0)
+    latencies, errors = run(lambda: client.get_json(url, deadline_s=1.0), 50)
+    report("caída total (stale)", latencies, errors)
+    print(f"estado del circuito: {client.breaker(stub.url.split('//')[1]).state}")
+
+    # 4xx (p. ej. NoRoute de OSRM): no abren el circuito ni lanzan segundo intento
+    client_4xx = UpstreamClient(failure_threshold=5, reset_timeout_s=1)
+    stub.set_faults(error_rate=0.0)
+    hits = sum(stub.hits.values())
+    latencies, errors = run(lambda: client_4xx.get_json(f"{stub.url}/noexiste", deadline_s=1.0), 20)
+    report("404 x20", latencies, errors)
+    print(f"peticiones al stub: {sum(stub.hits.values()) - hits}  "
+          f"circuito: {client_4xx.breaker(stub.url.split('//')[1]).state}")
+    stub.set_faults(error_rate=1.0)
+
+    fresh = UpstreamClient(failure_threshold=5, reset_timeout_s=1)
+    try:
+        fresh.get_json(url, deadline_s=1.0)
+    except UpstreamError as e:
+        print(f"sin caché: UpstreamError ({e})")
+
+    # Recuperación: tras reset_timeout_s una petición de prueba cierra el circuito
+    stub.set_faults(error_rate=0.0)
+    time.sleep(1.1)
+    client.get_json(url, deadline_s=1.0)
+    print(f"tras recuperación: {client.breaker(stub.url.split('//')[1]).state}")
+    stub.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query
+from typing import Literal
+import asyncio
+import os
+import pickle
+import shutil
+import tempfile
+
+from services import fuel_index
+from services.fuel import FUEL_TYPES, get_fuel_snapshot, parse_stations, filter_cheapest_parsed
+from services.polyline import decode_array
+from services.routes import get_route_encoded, calcular_coste, ROUTE_POLYLINE_PRECISION
+from services.singleflight import SingleFlight
+
+# Combustibles con precio en las tablas y en el listado que reciben los workers;
+# cualquier otro se rechaza con 422 en lugar de devolver una lista vacía
+Combustible = Literal[tuple(FUEL_TYPES)]
+
+WORKERS = int(os.environ.get("PREITV_API_WORKERS", str(os.cpu_count() or 2)))
+
+flights = SingleFlight()
+_pool = None
+_snapshot_dir = None
+# Último listado compacto escrito para los workers: {"ts", "path"}
+_snapshot_file = {"ts": None, "path": None}
+# En cada worker: listado ya cargado para un ts
+_worker_snapshot = {"ts": None, "parsed": None}
+
+@asynccontextmanager
+async def lifespan(app):
+    global _pool, _snapshot_dir
+    _pool = ProcessPoolExecutor(max_workers=WORKERS)
+    _snapshot_dir = tempfile.mkdtemp(prefix="preitv_snapshot_")
+    yield
+    _pool.shutdown(cancel_futures=True)
+    shutil.rmtree(_snapshot_dir, ignore_errors=True)
+
+app = FastAPI(title="API - Rutas y combustible", lifespan=lifespan)
+
+# Mismo catálogo que las tablas precalculadas (JSON + utils.cities)
+CITIES = fuel_index.load_cities()
+
+def city_lonlat(nombre: str):
+    ciudad = CITIES.get(nombre)
+    if not ciudad:
+        raise HTTPException(status_code=404, detail=f"Ciudad no encontrada: {nombre}")
+    lat, lon = ciudad
+    return lon, lat
+
+async def fetch_route(origen: str, destino: str):
+    """
+    Ruta entre dos ciudades con la geometría como polyline; peticiones
+    idénticas concurrentes se agrupan.
+    """
+    o, d = city_lonlat(origen), city_lonlat(destino)
+    route = await flights.do(("ruta", o, d), asyncio.to_thread, get_route_encoded, o, d)
+    if route is None:
+        raise HTTPException(status_code=502, detail="No se pudo calcular la ruta")
+    return route
+
+async def fetch_fuel_prices():
+    """
+    Instantánea de MITECO (get_fuel_snapshot, compartida y con caducidad);
+    una sola descarga aunque lleguen muchas peticiones.
+    """
+    return await flights.do("miteco", asyncio.to_thread, get_fuel_snapshot)
+
+def write_snapshot_file(snapshot_ts, stations):
+    """
+    Guarda el listado parseado y reducido a los campos que se devuelven, una
+    vez por instantánea. Los workers lo leen del disco al cambiar el ts, así
+    que por petición solo viajan la polyline y los parámetros.
+    """
+    if _snapshot_file["ts"] == snapshot_ts:
+        return _snapshot_file["path"]
+    campos = ("Rótulo", "Dirección", "Municipio")
+    parsed = [(idx, lat, lon, precios, {k: st.get(k) for k in campos})
+              for idx, lat, lon, precios, st in parse_stations(stations, FUEL_TYPES)]
+    path = os.path.join(_snapshot_dir, f"{snapshot_ts:.0f}.pkl")
+    with open(f"{path}.tmp", "wb") as f:
+        pickle.dump(parsed, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f"{path}.tmp", path)
+    # Se conserva el anterior para las peticiones que ya están en la cola del pool
+    keep = {path, _snapshot_file["path"]}
+    _snapshot_file.update(ts=snapshot_ts, path=path)
+    for name in os.listdir(_snapshot_dir):
+        if os.path.join(_snapshot_dir, name) not in keep:
+            try:
+                os.remove(os.path.join(_snapshot_dir, name))
+            except OSError:
+                pass
+    return path
+
+def filter_cheapest_on_encoded_route(snapshot_ts, snapshot_path, encoded, fuel_type, max_distance_km, limit):
+    """Se ejecuta en el worker: filtro sobre el listado de snapshot_path (cargado una vez por ts)."""
+    if _worker_snapshot["ts"] != snapshot_ts:
+        with open(snapshot_path, "rb") as f:
+            _worker_snapshot["parsed"] = pickle.load(f)
+        _worker_snapshot["ts"] = snapshot_ts
+    coords = decode_array(encoded, ROUTE_POLYLINE_PRECISION)
+    return filter_cheapest_parsed(_worker_snapshot["parsed"], coords, [fuel_type], max_distance_km, limit)[fuel_type]
+
+@app.get("/ruta")
+async def ruta(origen: str, destino: str, formato: str = "polyline"):
+    """
+    Distancia, duración y geometría de la ruta entre dos ciudades.
+    formato=polyline (por defecto) devuelve la geometría codificada;
+    formato=geojson la devuelve como lista de coordenadas [lon, lat].
+    """
+    distancia_km, duracion_min, encoded = await fetch_route(origen, destino)
+    result = {"distancia_km": distancia_km, "duracion_min": duracion_min}
+    if formato == "geojson":
+        result["coordenadas"] = decode_array(encoded, ROUTE_POLYLINE_PRECISION).tolist()
+    else:
+        result["geometria"] = encoded
+        result["precision"] = ROUTE_POLYLINE_PRECISION
+    return result
+
+@app.get("/coste")
+def coste(distancia_km: float, consumo: float, precio: float):
+    """Litros y coste de combustible para una distancia"""
+    litros, total = calcular_coste(distancia_km, consumo, precio)
+    return {"litros": litros, "coste": total}
+
+@app.get("/gasolineras")
+async def gasolineras(origen: str, destino: str, combustible: Combustible = "Gasolina 95 E5",
+                      max_km: float = Query(5, gt=0), limit: int = Query(5, ge=1)):
+    """Estaciones más baratas cerca de la ruta entre dos ciudades"""
+    (_, _, encoded), (snapshot_ts, stations) = await asyncio.gather(
+        fetch_route(origen, destino), fetch_fuel_prices()
+    )
+
+    async def _filter():
+        path = await flights.do(("snapshot", snapshot_ts), asyncio.to_thread,
+                                write_snapshot_file, snapshot_ts, stations)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _pool, filter_cheapest_on_encoded_route, snapshot_ts, path, encoded, combustible, max_km, limit
+        )
+
+    key = ("gasolineras", origen, destino, combustible, max_km, limit, snapshot_ts)
+    return await flights.do(key, _filter)
+
+@app.get("/gasolineras/ciudad/{nombre}")
+def gasolineras_ciudad(nombre: str, combustible: Combustible = "Gasoleo A", radio_km: float = Query(10, gt=0)):
+    """Estaciones más baratas cerca de una ciudad (tablas precalculadas)"""
+    if nombre not in CITIES:
+        raise HTTPException(status_code=404, detail=f"Ciudad no encontrada: {nombre}")
+    return fuel_index.cheapest_near_city(nombre, combustible, radio_km)
+
+@app.get("/gasolineras/provincia/{nombre}")
+def gasolineras_provincia(nombre: str, combustible: Combustible = "Gasoleo A"):
+    """Estaciones más baratas de una provincia (tablas precalculadas)"""
+    return fuel_index.cheapest_in_province(nombre, combustible)
@@ -1,14 +1,17 @@
 # Módulo para las APIs de marcas y modelos de vehículos
 
-import requests
+import os
 
-API_BASE = "https://parallelum.com.br/fipe/api/v1/carros"
+from services.upstream import get_json
+
+API_BASE = os.environ.get("PREITV_FIPE_URL", "https://parallelum.com.br/fipe/api/v1/carros")
+
+# Plazo máximo por llamada a la API de FIPE
+DEADLINE_S = 5
 
 def get_makes():
     try:
-        res = requests.get(f"{API_BASE}/marcas")
-        res.raise_for_status()
-        data = res.json()
+        data = get_json(f"{API_BASE}/marcas", DEADLINE_S)
         return [item["nome"] for item in data]
     except:
         return []
@@ -16,14 +19,12 @@ def get_makes():
 def get_models(make_name):
     try:
         # Obtener código de marca
-        res_marca = requests.get(f"{API_BASE}/marcas")
-        marca = next((m for m in res_marca.json() if m["nome"] == make_name), None)
+        marcas = get_json(f"{API_BASE}/marcas", DEADLINE_S)
+        marca = next((m for m in marcas if m["nome"] == make_name), None)
         if not marca:
             return []
         codigo = marca["codigo"]
-        res_models = requests.get(f"{API_BASE}/marcas/{codigo}/modelos")
-        res_models.raise_for_status()
-        data = res_models.json()
+        data = get_json(f"{API_BASE}/marcas/{codigo}/modelos", DEADLINE_S)
         return [item["nome"] for item in data.get("modelos", [])]
     except:
         return []
@@ -0,0 +1,123 @@
+# Simulador de costes en bloque (tablas de sensibilidad)
+#
+# Misma fórmula que services/routes.calcular_coste, pero vectorizada sobre
+# rutas × consumos × precios. El redondeo a 2 decimales se aplica solo al
+# final, como hace calcular_coste con cada valor.
+#
+#   python -m services.cost_sim --consumos 5 6.5 8 --precios 1.55 1.65 1.75 --salida costes.csv
+
+import argparse
+import csv
+import json
+import os
+import sys
+
+import numpy as np
+
+from services.routes import get_distance_matrix
+
+CITIES_FILE = os.path.join(os.path.dirname(__file__), "..", "Utils", "ciudades_coords.json")
+
+def cost_grid(distancias_km, consumos_l_100km, precios_l, redondear=True):
+    """
+    Calcula litros y coste para todas las combinaciones.
+    - distancias_km: R distancias (una por ruta)
+    - consumos_l_100km: C consumos
+    - precios_l: P precios
+    Devuelve (litros[R, C], coste[R, C, P]).
+    """
+    d = np.asarray(distancias_km, dtype=np.float64)
+    c = np.asarray(consumos_l_100km, dtype=np.float64)
+    p = np.asarray(precios_l, dtype=np.float64)
+    litros = np.multiply.outer(d, c) / 100
+    coste = np.multiply.outer(litros, p)
+    if redondear:
+        return np.round(litros, 2), np.round(coste, 2)
+    return litros, coste
+
+def city_matrix_distances(coords_by_city):
+    """
+    Distancias por carretera entre todos los pares de ciudades (una sola
+    matriz de OSRM, ver get_distance_matrix).
+    coords_by_city: {ciudad: (lat, lon)} como ciudades_coords.
+    Devuelve (rutas ["Origen → Destino", ...], distancias_km, sin_ruta) donde
+    sin_ruta son los pares ("Origen", "Destino") que no tienen ruta.
+    """
+    cities = list(coords_by_city)
+    matrix = get_distance_matrix([(lon, lat) for lat, lon in (coords_by_city[c] for c in cities)])
+    rutas, distancias, sin_ruta = [], [], []
+    for i, origen in enumerate(cities):
+        for j, destino in enumerate(cities):
+            if i == j:
+                continue
+            if np.isnan(matrix[i, j]):
+                sin_ruta.append((origen, destino))
+            else:
+                rutas.append(f"{origen} → {destino}")
+                distancias.append(matrix[i, j])
+    return rutas, np.array(distancias, dtype=np.float64), sin_ruta
+
+def export_cost_grid(path, rutas, consumos_l_100km, precios_l, litros, coste):
+    """
+    Exporta la tabla en formato largo (ruta, consumo, precio, litros, coste).
+    El formato se elige por extensión: .csv o .parquet (requiere pyarrow).
+    """
+    n_r, n_c, n_p = coste.shape
+    consumos = np.repeat(np.asarray(consumos_l_100km, dtype=np.float64), n_p)
+    precios = np.tile(np.asarray(precios_l, dtype=np.float64), n_c)
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Exportar a Parquet requiere pyarrow (pip install pyarrow)")
+        rutas_idx = np.repeat(np.arange(n_r, dtype=np.int32), n_c * n_p)
+        table = pa.table({
+            "ruta": pa.DictionaryArray.from_arrays(rutas_idx, pa.array(list(rutas))),
+            "consumo_l_100km": np.tile(consumos, n_r),
+            "precio_l": np.tile(precios, n_r),
+            "litros": np.repeat(litros.ravel(), n_p),
+            "coste": coste.ravel(),
+        })
+        pq.write_table(table, path)
+    elif ext == ".csv":
+        # Se escribe ruta a ruta para no materializar toda la tabla como objetos Python
+        consumos_list, precios_list = consumos.tolist(), precios.tolist()
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["ruta", "consumo_l_100km", "precio_l", "litros", "coste"])
+            for i, ruta in enumerate(rutas):
+                writer.writerows(zip(
+                    [ruta] * (n_c * n_p), consumos_list, precios_list,
+                    np.repeat(litros[i], n_p).tolist(), coste[i].ravel().tolist()
+                ))
+    else:
+        raise ValueError(f"Formato no soportado: {ext} (usa .csv o .parquet)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Tabla de costes entre ciudades del catálogo")
+    parser.add_argument("--consumos", nargs="+", type=float, required=True, help="L/100km")
+    parser.add_argument("--precios", nargs="+", type=float, required=True, help="€/L")
+    parser.add_argument("--ciudades", nargs="+", help="subconjunto del catálogo (por defecto, todas)")
+    parser.add_argument("--salida", required=True, help="fichero .csv o .parquet")
+    args = parser.parse_args()
+
+    with open(CITIES_FILE, encoding="utf-8") as f:
+        catalogo = json.load(f)
+    nombres = args.ciudades or list(catalogo)
+    desconocidas = [c for c in nombres if c not in catalogo]
+    if desconocidas:
+        parser.error(f"Ciudades no encontradas: {', '.join(desconocidas)}")
+
+    rutas, distancias, sin_ruta = city_matrix_distances({c: catalogo[c] for c in nombres})
+    litros, coste = cost_grid(distancias, args.consumos, args.precios)
+    export_cost_grid(args.salida, rutas, args.consumos, args.precios, litros, coste)
+    print(f"{len(rutas)} rutas × {len(args.consumos)} consumos × {len(args.precios)} precios -> {args.salida}")
+    if sin_ruta:
+        print(f"{len(sin_ruta)} pares sin ruta por carretera:", file=sys.stderr)
+        for origen, destino in sin_ruta:
+            print(f"  {origen} → {destino}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,26 @@
-import requests
+import heapq
+import os
 import logging
-from math import radians, cos, sin, asin, sqrt
+import threading
+import time
+from math import radians, cos, sin, asin, sqrt, floor, pi
 
-MITECO_URL = "https://sedeaplicaciones.minetur.gob.es/ServiciosRESTCarburantes/PreciosCarburantes/EstacionesTerrestres/"
+import numpy as np
+
+from services.upstream import get_json
+
+MITECO_URL = os.environ.get(
+    "PREITV_MITECO_URL",
+    "https://sedeaplicaciones.minetur.gob.es/ServiciosRESTCarburantes/PreciosCarburantes/EstacionesTerrestres/"
+)
+# Plazo máximo para descargar el listado completo de estaciones
+MITECO_DEADLINE_S = 15
+# km por grado de meridiano con el radio de haversine (6371 km)
+KM_PER_DEGREE = 6371 * pi / 180
+# Margen sobre el lado de las celdas de RouteCorridor (redondeo y curvatura)
+CORRIDOR_CELL_PAD = 1.01
+# Lado mínimo de celda en km, para max_distance_km = 0 (solo puntos de la ruta)
+CORRIDOR_MIN_CELL_KM = 0.001
 
 def haversine(lon1, lat1, lon2, lat2):
     """Distancia en km entre dos coordenadas."""
@@ -13,12 +31,105 @@ def haversine(lon1, lat1, lon2, lat2):
     c = 2 * asin(sqrt(a))
     return 6371 * c
 
+def _to_float(valor):
+    """Convierte un número con coma decimal (formato MITECO) a float."""
+    return float(valor.replace(",", "."))
+
+def route_km_marks(route_coords):
+    """
+    Distancia acumulada (km) desde el origen en cada punto de la ruta.
+    Acepta lista [[lon, lat], ...] o array (n, 2) como el de polyline.decode_array.
+    """
+    coords = np.radians(np.asarray(route_coords, dtype=np.float64).reshape(-1, 2))
+    if len(coords) < 2:
+        return [0.0]
+    lon, lat = coords[:, 0], coords[:, 1]
+    a = np.sin(np.diff(lat) / 2)**2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2)**2
+    marks = np.empty(len(coords))
+    marks[0] = 0.0
+    np.cumsum(6371 * 2 * np.arcsin(np.sqrt(a)), out=marks[1:])
+    return marks.tolist()
+
+class RouteCorridor:
+    """
+    Índice en rejilla de los puntos de una ruta para consultas de cercanía.
+    Cada celda mide al menos max_distance_km de lado, así que basta con mirar
+    las 9 celdas vecinas en lugar de recorrer la ruta entera por estación.
+    El ancho en longitud se calcula en la latitud más alejada del ecuador a
+    la que puede estar una estación del corredor y con un margen, para no
+    perder estaciones justo en el borde del radio.
+    """
+
+    def __init__(self, route_coords, max_distance_km=5):
+        coords = np.asarray(route_coords, dtype=np.float64).reshape(-1, 2)
+        self.max_distance_km = max_distance_km
+        self.km_marks = route_km_marks(coords)
+        max_lat = float(np.abs(coords[:, 1]).max()) if len(coords) else 0.0
+        cell_km = max(max_distance_km, CORRIDOR_MIN_CELL_KM) * CORRIDOR_CELL_PAD
+        self.cell_lat = cell_km / KM_PER_DEGREE
+        lat_borde = min(max_lat + self.cell_lat, 89.0)
+        self.cell_lon = cell_km / (KM_PER_DEGREE * max(cos(radians(lat_borde)), 0.01))
+        self.cells = {}
+        keys_i = np.floor(coords[:, 1] / self.cell_lat).astype(np.int64).tolist()
+        keys_j = np.floor(coords[:, 0] / self.cell_lon).astype(np.int64).tolist()
+        lons, lats = coords[:, 0].tolist(), coords[:, 1].tolist()
+        for i, key in enumerate(zip(keys_i, keys_j)):
+            self.cells.setdefault(key, []).append((i, lons[i], lats[i]))
+
+    def nearest(self, lon, lat):
+        """
+        Devuelve (distancia_km, km_en_ruta) del punto de ruta más cercano,
+        o None si no hay ninguno a menos de max_distance_km.
+        """
+        ci = floor(lat / self.cell_lat)
+        cj = floor(lon / self.cell_lon)
+        best = None
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                for i, lon_r, lat_r in self.cells.get((ci + di, cj + dj), ()):
+                    d = haversine(lon, lat, lon_r, lat_r)
+                    if d <= self.max_distance_km and (best is None or d < best[0]):
+                        best = (d, self.km_marks[i])
+        return best
+
+# Combustibles que se muestran en la app (nombre tras "Precio " en MITECO)
+FUEL_TYPES = ["Gasolina 95 E5", "Gasolina 98 E5", "Gasoleo A", "Gases licuados del petróleo"]
+
+# Instantánea compartida del listado de MITECO (se publica cada ~30 min)
+FUEL_SNAPSHOT_TTL_S = int(os.environ.get("PREITV_FUEL_PRICES_TTL", "1800"))
+_snapshot = {"ts": 0.0, "stations": []}
+_snapshot_lock = threading.Lock()
+_snapshot_listeners = []
+
+def on_new_snapshot(callback):
+    """
+    Registra callback(ts, estaciones), que se ejecuta en segundo plano cada
+    vez que get_fuel_snapshot descarga un listado nuevo.
+    """
+    _snapshot_listeners.append(callback)
+    return callback
+
+def get_fuel_snapshot(max_age_s=FUEL_SNAPSHOT_TTL_S):
+    """
+    Devuelve (timestamp, estaciones) de la última descarga de MITECO,
+    descargando de nuevo solo si tiene más de max_age_s segundos. La
+    instantánea se comparte entre todas las sesiones del proceso.
+    """
+    with _snapshot_lock:
+        if _snapshot["stations"] and time.time() - _snapshot["ts"] < max_age_s:
+            return _snapshot["ts"], _snapshot["stations"]
+        stations = get_fuel_prices()
+        if stations:
+            _snapshot["ts"] = time.time()
+            _snapshot["stations"] = stations
+            for callback in _snapshot_listeners:
+                threading.Thread(target=callback, args=(_snapshot["ts"], stations), daemon=True).start()
+        return _snapshot["ts"], _snapshot["stations"]
+
 def get_fuel_prices():
     """Descarga listado de estaciones de servicio de MITECO."""
     try:
-        res = requests.get(MITECO_URL, timeout=15)
-        res.raise_for_status()
-        data = res.json()
+        data = get_json(MITECO_URL, MITECO_DEADLINE_S)
         return data.get("ListaEESSPrecio", [])
     except Exception as e:
         logging.error(f"Error obteniendo precios MITECO: {e}")
@@ -32,29 +143,176 @@ def filter_cheapest_on_route(stations, route_coords, fuel_type="Gasolina 95 E5",
     - fuel_type: tipo de combustible a buscar
     - max_distance_km: distancia máxima a la ruta
     """
-    candidates = []
-    for st in stations:
+    return filter_cheapest_on_route_multi(stations, route_coords, [fuel_type], max_distance_km, limit)[fuel_type]
+
+def parse_stations(stations, fuel_types):
+    """
+    Convierte el listado de MITECO a tuplas (idx, lat, lon, [(fuel, precio)], estación)
+    descartando las que no tienen coordenadas válidas ni precio para ningún
+    combustible pedido. Se puede hacer una vez por descarga y reutilizar.
+    """
+    price_keys = [(fuel, f"Precio {fuel}") for fuel in fuel_types]
+    parsed = []
+    for idx, st in enumerate(stations):
         try:
-            lat = float(st["Latitud"].replace(",", "."))
-            lon = float(st["Longitud (WGS84)"].replace(",", "."))
-            precio_str = st.get(f"Precio {fuel_type}")
-            if not precio_str or precio_str.strip() == "":
+            precios = []
+            for fuel, key in price_keys:
+                precio_str = st.get(key)
+                if precio_str and precio_str.strip() != "":
+                    precios.append((fuel, _to_float(precio_str)))
+            if not precios:
                 continue
-            precio = float(precio_str.replace(",", "."))
-            # Comprobar si está cerca de algún punto de la ruta
-            for lon_r, lat_r in route_coords:
-                if haversine(lon, lat, lon_r, lat_r) <= max_distance_km:
-                    candidates.append({
-                        "rotulo": st.get("Rótulo"),
-                        "direccion": st.get("Dirección"),
-                        "municipio": st.get("Municipio"),
-                        "precio": precio,
-                        "lat": lat,
-                        "lon": lon
-                    })
-                    break
+            lat = _to_float(st["Latitud"])
+            lon = _to_float(st["Longitud (WGS84)"])
         except Exception:
             continue
-    # Ordenar por precio ascendente
-    candidates.sort(key=lambda x: x["precio"])
-    return candidates[:limit]
\ No newline at end of file
+        parsed.append((idx, lat, lon, precios, st))
+    return parsed
+
+def _push_top_k(heap, precio, idx, item, limit):
+    """Mantiene en `heap` los `limit` elementos más baratos (a igual precio, el primero)."""
+    if limit <= 0:
+        return
+    # Montículo de máximos con (-precio, -idx)
+    entry = (-precio, -idx, item)
+    if len(heap) < limit:
+        heapq.heappush(heap, entry)
+    elif entry > heap[0]:
+        heapq.heapreplace(heap, entry)
+
+def _ranking(heap):
+    """Estaciones de un montículo de _push_top_k ordenadas por precio."""
+    ranking = []
+    for neg_precio, _, (st, lat, lon) in sorted(heap, reverse=True):
+        ranking.append({
+            "rotulo": st.get("Rótulo"),
+            "direccion": st.get("Dirección"),
+            "municipio": st.get("Municipio"),
+            "precio": -neg_precio,
+            "lat": lat,
+            "lon": lon
+        })
+    return ranking
+
+def filter_cheapest_on_route_multi(stations, route_coords, fuel_types, max_distance_km=5, limit=5):
+    """
+    Igual que filter_cheapest_on_route pero para varios combustibles en una
+    sola pasada: la cercanía a la ruta se comprueba una vez por estación y
+    cada combustible mantiene un montículo acotado con sus `limit` mejores.
+    Devuelve {fuel_type: [estaciones ordenadas por precio]}.
+    """
+    parsed = parse_stations(stations, fuel_types)
+    return filter_cheapest_parsed(parsed, route_coords, fuel_types, max_distance_km, limit)
+
+def filter_cheapest_parsed(parsed, route_coords, fuel_types, max_distance_km=5, limit=5):
+    """filter_cheapest_on_route_multi sobre la salida de parse_stations."""
+    corridor = RouteCorridor(route_coords, max_distance_km)
+    heaps = {fuel: [] for fuel in fuel_types}
+    for idx, lat, lon, precios, st in parsed:
+        if corridor.nearest(lon, lat) is None:
+            continue
+        for fuel, precio in precios:
+            if fuel in heaps:
+                _push_top_k(heaps[fuel], precio, idx, (st, lat, lon), limit)
+    return {fuel: _ranking(heap) for fuel, heap in heaps.items()}
+
+def project_stations_on_route(stations, route_coords, fuel_type="Gasolina 95 E5", max_distance_km=5):
+    """
+    Proyecta sobre la ruta las estaciones del corredor.
+    Devuelve una lista ordenada por km desde el origen con los mismos campos
+    que filter_cheapest_on_route más "km" (posición en ruta) y "desvio_km".
+    """
+    return project_parsed_on_route(parse_stations(stations, [fuel_type]), route_coords, fuel_type, max_distance_km)
+
+def project_parsed_on_route(parsed, route_coords, fuel_type="Gasolina 95 E5", max_distance_km=5):
+    """project_stations_on_route sobre la salida de parse_stations."""
+    corridor = RouteCorridor(route_coords, max_distance_km)
+    projected = []
+    for idx, lat, lon, precios, st in parsed:
+        precio = next((p for fuel, p in precios if fuel == fuel_type), None)
+        if precio is None:
+            continue
+        hit = corridor.nearest(lon, lat)
+        if hit is None:
+            continue
+        projected.append({
+            "rotulo": st.get("Rótulo"),
+            "direccion": st.get("Dirección"),
+            "municipio": st.get("Municipio"),
+            "precio": precio,
+            "lat": lat,
+            "lon": lon,
+            "km": hit[1],
+            "desvio_km": hit[0]
+        })
+    projected.sort(key=lambda x: x["km"])
+    return projected
+
+def plan_refuel_stops(route_stations, route_coords, tank_l, fuel_inicial_l, consumo_l_100km):
+    """
+    Calcula el plan de repostaje de coste mínimo a lo largo de la ruta.
+    - route_stations: salida de project_stations_on_route (ordenada por km)
+    - route_coords: la misma geometría usada al proyectar; la longitud se mide
+      sobre ella (route_km_marks) para que esté en la misma escala que "km"
+    - tank_l: capacidad del depósito en litros
+    - fuel_inicial_l: litros en el depósito al salir
+    - consumo_l_100km: consumo medio, el mismo que usa calcular_coste
+    En cada estación se mira la siguiente más barata: si está al alcance se
+    carga solo lo justo para llegar a ella; si no, se llena el depósito.
+    Parar en una estación cuesta además ir y volver a la ruta (2 × desvio_km);
+    ese gasto se descuenta del depósito, pero el orden de precios no lo tiene
+    en cuenta, así que con desvíos el plan es aproximado.
+    Devuelve {"paradas", "litros_total", "coste_total"} o None si la ruta no
+    se puede completar con la autonomía disponible.
+    """
+    route_km = route_km_marks(route_coords)[-1]
+    litros_km = consumo_l_100km / 100
+    fuel = min(fuel_inicial_l, tank_l)
+    points = [s for s in route_stations if s["km"] <= route_km]
+    points.sort(key=lambda x: x["km"])
+    # Siguiente estación estrictamente más barata (el destino cuenta como precio -1)
+    n = len(points)
+    next_cheaper = [n] * n
+    stack = []
+    for i in range(n - 1, -1, -1):
+        while stack and points[stack[-1]]["precio"] >= points[i]["precio"]:
+            stack.pop()
+        next_cheaper[i] = stack[-1] if stack else n
+        stack.append(i)
+
+    paradas = []
+    litros_total = coste_total = 0.0
+    km_actual = 0.0
+    eps = 1e-9
+    for i, st in enumerate(points):
+        fuel -= (st["km"] - km_actual) * litros_km
+        km_actual = st["km"]
+        if fuel < -eps:
+            return None
+        desvio_l = st.get("desvio_km", 0.0) * litros_km
+        if next_cheaper[i] < n:
+            objetivo = points[next_cheaper[i]]
+            # Hay que llegar con lo justo para el desvío hasta la estación
+            necesario = (objetivo["km"] - km_actual + objetivo.get("desvio_km", 0.0)) * litros_km
+        else:
+            necesario = (route_km - km_actual) * litros_km
+        if necesario - fuel <= eps:
+            continue
+        # Ir a la estación (ida) y cargar lo necesario más la vuelta a la ruta
+        if fuel - desvio_l < -eps:
+            continue
+        litros = min(necesario + desvio_l, tank_l) - (fuel - desvio_l)
+        if litros <= eps:
+            continue
+        fuel += litros - 2 * desvio_l
+        coste = litros * st["precio"]
+        litros_total += litros
+        coste_total += coste
+        paradas.append({**st, "litros": round(litros, 2), "coste": round(coste, 2)})
+    if fuel - (route_km - km_actual) * litros_km < -eps:
+        return None
+    return {
+        "paradas": paradas,
+        "litros_total": round(litros_total, 2),
+        "coste_total": round(coste_total, 2)
+    }
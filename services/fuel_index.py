@@ -0,0 +1,178 @@
+# Tablas precalculadas de gasolineras más baratas por ciudad y provincia
+#
+# Se reconstruyen con cada instantánea nueva de MITECO y se guardan en
+# memoria y en data/cheapest_fuel.json, de forma que "gasóleo más barato
+# cerca de Zaragoza" es una búsqueda en un diccionario.
+
+import json
+import logging
+import os
+import threading
+import time
+
+from services.fuel import (
+    FUEL_TYPES, FUEL_SNAPSHOT_TTL_S, haversine, parse_stations, get_fuel_snapshot,
+    on_new_snapshot, _push_top_k, _ranking
+)
+from utils.cities import ciudades_coords
+
+BASE_DIR = os.path.join(os.path.dirname(__file__), "..")
+CITIES_FILE = os.path.join(BASE_DIR, "Utils", "ciudades_coords.json")
+INDEX_FILE = os.environ.get("PREITV_FUEL_INDEX_FILE", os.path.join(BASE_DIR, "data", "cheapest_fuel.json"))
+
+RADII_KM = (5, 10, 25)
+TOP_K = 5
+# Espera mínima entre intentos de actualización si MITECO falla
+REFRESH_RETRY_S = 60
+
+_index = None
+_disk_checked = False
+_index_lock = threading.Lock()
+_build_lock = threading.Lock()
+# Una sola actualización en segundo plano a la vez
+_refresh_lock = threading.Lock()
+_last_refresh = 0.0
+
+def load_cities():
+    """
+    Ciudades de Utils/ciudades_coords.json más las de utils.cities (las de
+    los desplegables de la app, que tienen preferencia si están en ambos).
+    """
+    with open(CITIES_FILE, "r", encoding="utf-8") as f:
+        cities = json.load(f)
+    cities.update({city: list(coords) for city, coords in ciudades_coords.items()})
+    return cities
+
+def _province_key(nombre):
+    return (nombre or "").strip().upper()
+
+def build_index(stations, cities, fuel_types=FUEL_TYPES, radii_km=RADII_KM, k=TOP_K, snapshot_ts=0.0):
+    """
+    Calcula el top-k por combustible para cada ciudad (a cada radio) y cada provincia.
+    - cities: {ciudad: [lat, lon]}
+    Devuelve un dict serializable a JSON.
+    """
+    radii_km = sorted(radii_km)
+    max_radius = radii_km[-1]
+    city_heaps = {city: {r: {fuel: [] for fuel in fuel_types} for r in radii_km} for city in cities}
+    province_heaps = {}
+    city_list = [(city, lat, lon) for city, (lat, lon) in cities.items()]
+    # 1 grado de latitud ~ 111 km: descarte rápido antes de calcular distancias
+    max_dlat = max_radius / 110.5
+
+    for idx, lat, lon, precios, st in parse_stations(stations, fuel_types):
+        item = (st, lat, lon)
+        province = province_heaps.setdefault(_province_key(st.get("Provincia")), {})
+        for fuel, precio in precios:
+            _push_top_k(province.setdefault(fuel, []), precio, idx, item, k)
+        for city, lat_c, lon_c in city_list:
+            if abs(lat - lat_c) > max_dlat:
+                continue
+            d = haversine(lon, lat, lon_c, lat_c)
+            if d > max_radius:
+                continue
+            for r in radii_km:
+                if d <= r:
+                    heaps = city_heaps[city][r]
+                    for fuel, precio in precios:
+                        _push_top_k(heaps[fuel], precio, idx, item, k)
+
+    return {
+        "snapshot_ts": snapshot_ts,
+        "radios_km": radii_km,
+        "ciudades": {
+            city: {str(r): {fuel: _ranking(h) for fuel, h in by_fuel.items()} for r, by_fuel in by_radius.items()}
+            for city, by_radius in city_heaps.items()
+        },
+        "provincias": {
+            prov: {fuel: _ranking(h) for fuel, h in by_fuel.items()}
+            for prov, by_fuel in province_heaps.items() if prov
+        },
+    }
+
+def save_index(index, path=None):
+    path = path or INDEX_FILE
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def load_index(path=None):
+    try:
+        with open(path or INDEX_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+@on_new_snapshot
+def refresh_index(snapshot_ts, stations):
+    """Reconstruye y guarda las tablas para una instantánea de MITECO."""
+    global _index
+    with _build_lock:
+        if _index is not None and _index["snapshot_ts"] >= snapshot_ts:
+            return _index
+        try:
+            index = build_index(stations, load_cities(), snapshot_ts=snapshot_ts)
+            save_index(index)
+        except Exception as e:
+            logging.error(f"Error generando índice de gasolineras: {e}")
+            return _index
+        with _index_lock:
+            _index = index
+        return _index
+
+def _refresh_in_background():
+    """Pide una instantánea y reconstruye las tablas en un hilo, si no hay otro ya."""
+    global _last_refresh
+    if time.time() - _last_refresh < REFRESH_RETRY_S or not _refresh_lock.acquire(blocking=False):
+        return
+    _last_refresh = time.time()
+
+    def run():
+        try:
+            # Si la descarga es nueva, on_new_snapshot también llama a
+            # refresh_index; _build_lock hace que se construya una sola vez
+            ts, stations = get_fuel_snapshot()
+            if stations:
+                refresh_index(ts, stations)
+        finally:
+            _refresh_lock.release()
+    threading.Thread(target=run, daemon=True).start()
+
+def get_index():
+    """
+    Tablas vigentes: en memoria o, la primera vez, desde disco. Si no hay o
+    están caducadas se actualizan en segundo plano y mientras tanto se sirven
+    las que haya (None al arrancar en frío): nunca se descarga dentro de la
+    petición.
+    """
+    global _index, _disk_checked
+    if _index is None and not _disk_checked:
+        with _index_lock:
+            if _index is None and not _disk_checked:
+                _index = load_index()
+                _disk_checked = True
+    index = _index
+    if index is None or time.time() - index["snapshot_ts"] > FUEL_SNAPSHOT_TTL_S:
+        _refresh_in_background()
+    return index
+
+def cheapest_near_city(city, fuel_type="Gasoleo A", radius_km=10):
+    """
+    Gasolineras más baratas cerca de una ciudad del catálogo. Si el radio no
+    está precalculado se usa el menor radio precalculado que lo cubra.
+    """
+    index = get_index()
+    if not index or city not in index["ciudades"]:
+        return []
+    radios = index["radios_km"]
+    radius = next((r for r in radios if r >= radius_km), radios[-1])
+    return index["ciudades"][city][str(radius)].get(fuel_type, [])
+
+def cheapest_in_province(province, fuel_type="Gasoleo A"):
+    """Gasolineras más baratas de una provincia (campo Provincia de MITECO)."""
+    index = get_index()
+    if not index:
+        return []
+    return index["provincias"].get(_province_key(province), {}).get(fuel_type, [])
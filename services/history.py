@@ -0,0 +1,113 @@
+# Historial de rutas por sesión, acotado en memoria y paginado
+#
+# En la sesión solo se guardan las últimas HISTORY_WINDOW rutas como objetos
+# compactos (__slots__). Cada ruta se escribe además en el almacenamiento
+# persistente, del que se leen las páginas más antiguas bajo demanda.
+
+from collections import deque
+
+HISTORY_WINDOW = 20
+PAGE_SIZE = 10
+
+class RouteRecord:
+    """Ruta calculada; mismos campos que usaba el historial en dicts."""
+    __slots__ = ("origen", "destino", "distancia_km", "duracion", "consumo_l", "coste", "geometria")
+
+    def __init__(self, origen, destino, distancia_km, duracion, consumo_l, coste, geometria=None):
+        self.origen = origen
+        self.destino = destino
+        self.distancia_km = float(distancia_km)
+        self.duracion = float(duracion)
+        self.consumo_l = float(consumo_l)
+        self.coste = float(coste)
+        # Polyline (services.routes.ROUTE_POLYLINE_PRECISION); solo hasta
+        # escribirla en el backend, el historial no la muestra
+        self.geometria = geometria
+
+    def to_results(self):
+        """Formato de `results` en la tabla searches (como save_route)."""
+        results = {
+            "origen": self.origen,
+            "destino": self.destino,
+            "distance_km": self.distancia_km,
+            "duration": self.duracion,
+            "consumption_l": self.consumo_l,
+            "cost": self.coste
+        }
+        if self.geometria:
+            results["geometry"] = self.geometria
+        return results
+
+    @classmethod
+    def from_row(cls, row):
+        results = row.get("results", {})
+        origen, _, destino = (row.get("city") or "").partition(" → ")
+        return cls(
+            results.get("origen", origen), results.get("destino", destino),
+            results.get("distance_km", 0), results.get("duration") or 0,
+            results.get("consumption_l", 0), results.get("cost", 0)
+        )
+
+class SupabaseHistoryBackend:
+    """Rutas de un usuario en la tabla searches (filas con city "Origen → Destino")."""
+
+    def __init__(self, client, user_id):
+        self.client = client
+        self.user_id = user_id
+
+    def _routes(self, columns, **kwargs):
+        return (self.client.table("searches").select(columns, **kwargs)
+                .eq("user_id", self.user_id).like("city", "% → %"))
+
+    def append(self, record):
+        self.client.table("searches").insert({
+            "user_id": self.user_id,
+            "city": f"{record.origen} → {record.destino}",
+            "results": record.to_results()
+        }).execute()
+
+    def count(self):
+        return self._routes("id", count="exact").execute().count or 0
+
+    def fetch(self, offset, limit):
+        """Rutas de la más reciente a la más antigua."""
+        res = (self._routes("city, results").order("created_at", desc=True)
+               .range(offset, offset + limit - 1).execute())
+        return [RouteRecord.from_row(row) for row in res.data or []]
+
+class HistoryStore:
+    """
+    Historial de una sesión: ventana fija de rutas recientes en memoria y el
+    resto en `backend` (None = solo memoria, se descartan las antiguas).
+    """
+
+    def __init__(self, backend=None, window=HISTORY_WINDOW):
+        self.backend = backend
+        self.recent = deque(maxlen=window)
+        self.total = 0
+        if backend is not None:
+            self.total = backend.count()
+            self.recent.extend(reversed(backend.fetch(0, window)))
+
+    def __len__(self):
+        return self.total if self.backend is not None else len(self.recent)
+
+    def add(self, record):
+        if self.backend is not None:
+            self.backend.append(record)
+        # La geometría (~15 KB en una ruta larga) ya está guardada: no se
+        # conserva en la ventana de la sesión
+        record.geometria = None
+        self.recent.append(record)
+        self.total += 1
+
+    def page(self, number, size=PAGE_SIZE):
+        """Página `number` (0 = más recientes) de `size` rutas, de nueva a antigua."""
+        offset = number * size
+        if offset + size <= len(self.recent) or self.backend is None:
+            newest_first = list(reversed(self.recent))
+            return newest_first[offset:offset + size]
+        return self.backend.fetch(offset, size)
+
+    def pages(self, size=PAGE_SIZE):
+        return max(1, -(-len(self) // size))
@@ -0,0 +1,286 @@
+# Motor de rutas local (sin conexión) como alternativa a OSRM
+#
+# El grafo viario se guarda preprocesado en un directorio con arrays NumPy
+# en formato CSR que se abren con memory-map:
+#   offsets.npy  (int64, n+1)  inicio de las aristas de cada nodo
+#   targets.npy  (int32, m)    nodo destino de cada arista
+#   distance.npy (float32, m)  longitud de la arista en metros
+#   duration.npy (float32, m)  tiempo de la arista en segundos
+#   lat.npy, lon.npy (float64, n) coordenadas de los nodos
+#   rev_offsets.npy (int64, n+1), rev_edges.npy (int32, m)  grafo inverso:
+#                 aristas que llegan a cada nodo (índices en targets/duration)
+#   rev_sources.npy (int32, m) nodo origen de cada arista de rev_edges
+#   lm_from.npy, lm_to.npy (float32, L×n)  duración desde/hasta cada landmark
+#   meta.json    {"nodes", "edges", "landmarks"}
+#
+# Las rutas se calculan con búsqueda bidireccional ALT (A* con landmarks y
+# desigualdad triangular). Para medirla: python -m loadtest.router_bench
+
+import csv
+import heapq
+import json
+import os
+import sys
+from math import radians, cos
+
+import numpy as np
+
+GRAPH_FILES = ("offsets", "targets", "distance", "duration", "lat", "lon",
+               "rev_offsets", "rev_sources", "rev_edges", "lm_from", "lm_to")
+# Landmarks que se calculan al generar el grafo y los que se usan por consulta
+LANDMARKS = 16
+ACTIVE_LANDMARKS = 8
+# Duración para nodos inalcanzables desde/hasta un landmark (finita para no
+# operar con inf - inf en las cotas)
+UNREACHABLE_S = 1e30
+
+class LocalRouter:
+    """Calcula rutas más rápidas con ALT bidireccional sobre un grafo CSR mapeado en memoria."""
+
+    def __init__(self, graph_dir):
+        arrays = {name: np.load(os.path.join(graph_dir, f"{name}.npy"), mmap_mode="r")
+                  for name in GRAPH_FILES}
+        self.lat = arrays["lat"]
+        self.lon = arrays["lon"]
+        # memoryview sobre el mmap: el acceso por índice devuelve escalares de
+        # Python sin crear objetos NumPy, que es lo que domina el bucle de búsqueda
+        self._offsets = memoryview(arrays["offsets"])
+        self._targets = memoryview(arrays["targets"])
+        self._distance = memoryview(arrays["distance"])
+        self._duration = memoryview(arrays["duration"])
+        self._rev_offsets = memoryview(arrays["rev_offsets"])
+        self._rev_sources = memoryview(arrays["rev_sources"])
+        self._rev_edges = memoryview(arrays["rev_edges"])
+        self._lat = memoryview(self.lat)
+        self._lon = memoryview(self.lon)
+        self._lm_from = [memoryview(row) for row in arrays["lm_from"]]
+        self._lm_to = [memoryview(row) for row in arrays["lm_to"]]
+
+    def nearest_node(self, lon, lat):
+        """Nodo del grafo más cercano a (lon, lat)."""
+        dx = (self.lon - lon) * cos(radians(lat))
+        dy = self.lat - lat
+        return int(np.argmin(dx * dx + dy * dy))
+
+    def _potential(self, source, target):
+        """
+        Potencial p(v) = (cota(v→target) - cota(source→v)) / 2 con los
+        ACTIVE_LANDMARKS que mejor acotan source→target. La media hace que el
+        mismo potencial sirva (con signo cambiado) para la búsqueda inversa.
+        """
+        def bound(k, u, v):
+            to_lm, from_lm = self._lm_to[k], self._lm_from[k]
+            return max(to_lm[u] - to_lm[v], from_lm[v] - from_lm[u])
+        ranked = sorted(range(len(self._lm_to)), key=lambda k: bound(k, source, target), reverse=True)
+        rows = []
+        for k in ranked[:ACTIVE_LANDMARKS]:
+            to_lm, from_lm = self._lm_to[k], self._lm_from[k]
+            rows.append((to_lm, from_lm, to_lm[target], from_lm[target], to_lm[source], from_lm[source]))
+        cache = {}
+
+        def potential(v):
+            p = cache.get(v)
+            if p is None:
+                pi_t = pi_s = 0.0
+                for to_lm, from_lm, to_t, from_t, to_s, from_s in rows:
+                    a, b = to_lm[v], from_lm[v]
+                    # d(v,t) >= d(v,L) - d(t,L) y d(v,t) >= d(L,t) - d(L,v)
+                    x = a - to_t if a - to_t > from_t - b else from_t - b
+                    if x > pi_t:
+                        pi_t = x
+                    # d(s,v) >= d(s,L) - d(v,L) y d(s,v) >= d(L,v) - d(L,s)
+                    x = to_s - a if to_s - a > b - from_s else b - from_s
+                    if x > pi_s:
+                        pi_s = x
+                p = cache[v] = (pi_t - pi_s) / 2
+            return p
+        return potential
+
+    def shortest_path(self, source, target):
+        """
+        Camino de menor duración entre dos nodos.
+        Devuelve (nodos, aristas) o None si no hay camino; las aristas son los
+        índices en targets/distance/duration por los que pasa el camino.
+        """
+        if source == target:
+            return [source], []
+        offsets, targets, duration = self._offsets, self._targets, self._duration
+        rev_offsets, rev_sources, rev_edges = self._rev_offsets, self._rev_sources, self._rev_edges
+        potential = self._potential(source, target)
+        inf = float("inf")
+        dist_f, dist_r = {source: 0.0}, {target: 0.0}
+        # Arista relajada por la que se llegó a cada nodo (no la primera paralela)
+        # y, hacia delante, el nodo del que venía
+        edge_f, edge_r = {source: None}, {target: None}
+        heap_f = [(potential(source), source)]
+        heap_r = [(-potential(target), target)]
+        closed_f, closed_r = set(), set()
+        mu, meet = inf, -1
+        while heap_f and heap_r:
+            # Con potenciales medios, parar cuando los dos frentes superan mu
+            if heap_f[0][0] + heap_r[0][0] >= mu:
+                break
+            if heap_f[0][0] <= heap_r[0][0]:
+                _, u = heapq.heappop(heap_f)
+                if u in closed_f:
+                    continue
+                closed_f.add(u)
+                g = dist_f[u]
+                for e in range(offsets[u], offsets[u + 1]):
+                    v = targets[e]
+                    ng = g + duration[e]
+                    if ng < dist_f.get(v, inf):
+                        dist_f[v] = ng
+                        edge_f[v] = (e, u)
+                        heapq.heappush(heap_f, (ng + potential(v), v))
+                        if v in dist_r and ng + dist_r[v] < mu:
+                            mu, meet = ng + dist_r[v], v
+            else:
+                _, u = heapq.heappop(heap_r)
+                if u in closed_r:
+                    continue
+                closed_r.add(u)
+                g = dist_r[u]
+                for i in range(rev_offsets[u], rev_offsets[u + 1]):
+                    e = rev_edges[i]
+                    v = rev_sources[i]
+                    ng = g + duration[e]
+                    if ng < dist_r.get(v, inf):
+                        dist_r[v] = ng
+                        edge_r[v] = e
+                        heapq.heappush(heap_r, (ng - potential(v), v))
+                        if v in dist_f and ng + dist_f[v] < mu:
+                            mu, meet = ng + dist_f[v], v
+        if meet == -1:
+            return None
+        edges = []
+        u = meet
+        while edge_f[u] is not None:
+            e, u = edge_f[u]
+            edges.append(e)
+        edges.reverse()
+        u = meet
+        while edge_r[u] is not None:
+            e = edge_r[u]
+            edges.append(e)
+            u = targets[e]
+        nodes = [source] + [targets[e] for e in edges]
+        return nodes, edges
+
+    def route(self, origin: tuple, destination: tuple):
+        """
+        Ruta entre dos puntos (lon, lat) con la misma forma que la respuesta
+        de OSRM: (distancia_m, duracion_s, coordenadas [[lon, lat], ...]).
+        """
+        source = self.nearest_node(*origin)
+        target = self.nearest_node(*destination)
+        result = self.shortest_path(source, target)
+        if result is None:
+            return None
+        path, edges = result
+        distancia_m = sum(self._distance[e] for e in edges)
+        duracion_s = sum(self._duration[e] for e in edges)
+        coords = [[self._lon[n], self._lat[n]] for n in path]
+        return distancia_m, duracion_s, coords
+
+def _dijkstra_all(offsets, neighbours, weights, source):
+    """Duración desde source a todos los nodos (UNREACHABLE_S si no se llega)."""
+    n = len(offsets) - 1
+    dist = [UNREACHABLE_S] * n
+    dist[source] = 0.0
+    heap = [(0.0, source)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        for i in range(offsets[u], offsets[u + 1]):
+            v = neighbours[i]
+            nd = d + weights[i]
+            if nd < dist[v]:
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return dist
+
+def _build_landmarks(offsets, targets, duration, rev_offsets, rev_sources, rev_duration, k, seed=0):
+    """
+    Elige k landmarks por el método del más lejano (cada uno, el nodo más
+    alejado de los ya elegidos) y calcula la duración desde y hasta cada uno.
+    """
+    n = len(offsets) - 1
+    fwd = (offsets.tolist(), targets.tolist(), duration.astype(np.float64).tolist())
+    rev = (rev_offsets.tolist(), rev_sources.tolist(), rev_duration.astype(np.float64).tolist())
+    start = np.random.default_rng(seed).integers(n)
+    dist = np.asarray(_dijkstra_all(*fwd, start))
+    # Cercanía mínima a algún landmark ya elegido (los inalcanzables no cuentan)
+    closest = np.where(dist < UNREACHABLE_S, dist, -1.0)
+    lm_from = np.empty((k, n), dtype=np.float32)
+    lm_to = np.empty((k, n), dtype=np.float32)
+    for i in range(k):
+        landmark = int(np.argmax(closest))
+        lm_from[i] = _dijkstra_all(*fwd, landmark)
+        lm_to[i] = _dijkstra_all(*rev, landmark)
+        closest = np.minimum(closest, lm_from[i])
+    return lm_from, lm_to
+
+def build_graph(out_dir, nodes, edges, landmarks=LANDMARKS):
+    """
+    Genera el grafo CSR a partir de listas en memoria.
+    - nodes: [(lat, lon), ...] indexados por posición
+    - edges: [(origen, destino, distancia_m, duracion_s), ...] dirigidas
+    - landmarks: número de landmarks para ALT (dos Dijkstra completos por landmark)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    n = len(nodes)
+    edges = sorted(edges, key=lambda e: (e[0], e[1]))
+    sources = np.array([e[0] for e in edges], dtype=np.int32)
+    targets = np.array([e[1] for e in edges], dtype=np.int32)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n), out=offsets[1:])
+    distance = np.array([e[2] for e in edges], dtype=np.float32)
+    duration = np.array([e[3] for e in edges], dtype=np.float32)
+    # Grafo inverso: aristas ordenadas por destino
+    rev_edges = np.argsort(targets, kind="stable").astype(np.int32)
+    rev_offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(targets, minlength=n), out=rev_offsets[1:])
+    rev_sources = sources[rev_edges]
+    landmarks = min(landmarks, n)
+    lm_from, lm_to = _build_landmarks(offsets, targets, duration, rev_offsets, rev_sources,
+                                      duration[rev_edges], landmarks)
+    arrays = {
+        "offsets": offsets, "targets": targets, "distance": distance, "duration": duration,
+        "lat": np.array([p[0] for p in nodes], dtype=np.float64),
+        "lon": np.array([p[1] for p in nodes], dtype=np.float64),
+        "rev_offsets": rev_offsets, "rev_sources": rev_sources, "rev_edges": rev_edges,
+        "lm_from": lm_from, "lm_to": lm_to,
+    }
+    for name in GRAPH_FILES:
+        np.save(os.path.join(out_dir, f"{name}.npy"), arrays[name])
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"nodes": n, "edges": len(edges), "landmarks": landmarks}, f)
+
+def build_graph_from_csv(nodes_csv, edges_csv, out_dir):
+    """
+    Genera el grafo desde dos CSV exportados de OSM:
+    - nodes_csv: id,lat,lon
+    - edges_csv: origen,destino,distancia_m,duracion_s[,oneway]
+    Las aristas sin oneway=1 se añaden en ambos sentidos.
+    """
+    ids = {}
+    nodes = []
+    with open(nodes_csv, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            ids[row["id"]] = len(nodes)
+            nodes.append((float(row["lat"]), float(row["lon"])))
+    edges = []
+    with open(edges_csv, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            u, v = ids[row["origen"]], ids[row["destino"]]
+            d, t = float(row["distancia_m"]), float(row["duracion_s"])
+            edges.append((u, v, d, t))
+            if row.get("oneway", "0") != "1":
+                edges.append((v, u, d, t))
+    build_graph(out_dir, nodes, edges)
+
+if __name__ == "__main__":
+    # python -m services.local_router nodes.csv edges.csv data/road_graph
+    build_graph_from_csv(*sys.argv[1:4])
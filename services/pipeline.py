@@ -0,0 +1,79 @@
+# Planificación de ruta por etapas concurrentes
+#
+# La ruta (OSRM) y el listado de precios (MITECO) no dependen entre sí, así
+# que se piden a la vez. Mientras llega la ruta, el listado se descarga y se
+# pre-procesa (parse_stations), de modo que al tener la geometría solo queda
+# el filtro por corredor. Los resultados se van entregando según están listos.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from services.fuel import (
+    FUEL_TYPES, get_fuel_snapshot, parse_stations, filter_cheapest_parsed,
+    project_parsed_on_route, plan_refuel_stops
+)
+from services.routes import get_route_geometry, calcular_coste
+
+_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="pipeline")
+_parsed_cache = {"ts": None, "parsed": None}
+_parsed_lock = threading.Lock()
+
+def _load_parsed_stations(fuel_types):
+    """
+    Listado de MITECO ya parseado para todos los FUEL_TYPES; se parsea una vez
+    por instantánea y lo comparten todas las sesiones, pidan el combustible
+    que pidan (filter_cheapest_parsed se queda solo con los pedidos).
+    """
+    ts, stations = get_fuel_snapshot()
+    if not set(fuel_types) <= set(FUEL_TYPES):
+        return parse_stations(stations, fuel_types)
+    with _parsed_lock:
+        if _parsed_cache["ts"] != ts:
+            _parsed_cache["parsed"] = parse_stations(stations, FUEL_TYPES)
+            _parsed_cache["ts"] = ts
+        return _parsed_cache["parsed"]
+
+def plan_route(origin: tuple, destination: tuple, consumo_l_100km, precio_l,
+               fuel_types=("Gasolina 95 E5",), max_distance_km=5, limit=5,
+               tank_l=None, fuel_inicial_l=None):
+    """
+    Generador que entrega (etapa, datos) según van terminando las etapas:
+    - ("ruta", {distancia_km, duracion_min, litros, coste, coordenadas, geometria})
+      con coordenadas como array (n, 2) y geometria como polyline
+    - ("gasolineras", {fuel_type: [estaciones más baratas]})
+    - ("repostajes", plan_refuel_stops(...)) si se indica tank_l, para el
+      primer combustible; None si no se llega con esa autonomía
+    - ("error", {etapa, mensaje}) si falla la ruta (y se termina) o los precios
+    origin y destination son (lon, lat), como en services.routes.get_route.
+    """
+    fuel_types = list(fuel_types)
+    route_f = _pool.submit(get_route_geometry, origin, destination)
+    stations_f = _pool.submit(_load_parsed_stations, fuel_types)
+
+    route = route_f.result()
+    if route is None:
+        yield "error", {"etapa": "ruta", "mensaje": "No se pudo calcular la ruta"}
+        return
+    distancia_km, duracion_min, coords, encoded = route
+    litros, coste = calcular_coste(distancia_km, consumo_l_100km, precio_l)
+    yield "ruta", {
+        "distancia_km": distancia_km,
+        "duracion_min": duracion_min,
+        "litros": litros,
+        "coste": coste,
+        "coordenadas": coords,
+        "geometria": encoded
+    }
+
+    try:
+        parsed = stations_f.result()
+    except Exception:
+        parsed = []
+    if not parsed:
+        yield "error", {"etapa": "gasolineras", "mensaje": "No se pudieron obtener los precios de combustible"}
+        return
+    yield "gasolineras", filter_cheapest_parsed(parsed, coords, fuel_types, max_distance_km, limit)
+    if tank_l:
+        route_stations = project_parsed_on_route(parsed, coords, fuel_types[0], max_distance_km)
+        inicial = tank_l if fuel_inicial_l is None else fuel_inicial_l
+        yield "repostajes", plan_refuel_stops(route_stations, coords, tank_l, inicial, consumo_l_100km)
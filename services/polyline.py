@@ -0,0 +1,73 @@
+# Codificación compacta de geometrías de ruta (Encoded Polyline de Google)
+#
+# Cada punto se guarda como diferencia con el anterior, escalada a
+# 10**precision y en bloques de 5 bits como caracteres ASCII. Es el mismo
+# formato que devuelve OSRM con geometries=polyline / polyline6.
+# Las funciones trabajan con coordenadas [lon, lat] como el resto de la app;
+# el texto codificado sigue el orden (lat, lon) del estándar.
+
+import numpy as np
+
+def _encode_value(value, out):
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+
+def encode(coords, precision=5):
+    """Codifica [[lon, lat], ...] como polyline."""
+    factor = 10 ** precision
+    out = []
+    prev_lat = prev_lon = 0
+    for lon, lat in coords:
+        lat_i = round(lat * factor)
+        lon_i = round(lon * factor)
+        _encode_value(lat_i - prev_lat, out)
+        _encode_value(lon_i - prev_lon, out)
+        prev_lat, prev_lon = lat_i, lon_i
+    return "".join(out)
+
+def decode(encoded, precision=5):
+    """Decodifica una polyline a lista [[lon, lat], ...]."""
+    factor = 10 ** precision
+    coords = []
+    values = []
+    value = shift = 0
+    for ch in encoded:
+        b = ord(ch) - 63
+        value |= (b & 0x1f) << shift
+        shift += 5
+        if b < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value = shift = 0
+    lat = lon = 0
+    for i in range(0, len(values) - 1, 2):
+        lat += values[i]
+        lon += values[i + 1]
+        coords.append([lon / factor, lat / factor])
+    return coords
+
+def decode_array(encoded, precision=5):
+    """
+    Decodifica una polyline a un array NumPy (n, 2) de [lon, lat] sin crear
+    objetos Python por punto. Acepta str o bytes; los bytes se leen sin copia.
+    """
+    if isinstance(encoded, str):
+        encoded = encoded.encode("ascii")
+    raw = np.frombuffer(encoded, dtype=np.uint8)
+    if raw.size == 0:
+        return np.empty((0, 2), dtype=np.float64)
+    b = raw.astype(np.int64) - 63
+    ends = np.flatnonzero(b < 0x20)
+    if ends.size % 2 or ends[-1] != b.size - 1:
+        raise ValueError("Polyline incompleta")
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    # Posición de cada bloque de 5 bits dentro de su valor
+    pos = np.arange(b.size) - np.repeat(starts, ends - starts + 1)
+    values = np.add.reduceat((b & 0x1f) << (5 * pos), starts)
+    values = np.where(values & 1, ~(values >> 1), values >> 1)
+    latlon = np.cumsum(values.reshape(-1, 2), axis=0) / 10 ** precision
+    return np.ascontiguousarray(latlon[:, ::-1])
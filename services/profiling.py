@@ -0,0 +1,137 @@
+# Perfilado bajo demanda de reruns de Streamlit
+#
+# Un administrador activa el modo y cada rerun se perfila con cProfile,
+# etiquetado con página, pestaña y rol. Se guardan los últimos
+# PROFILE_CAPACITY perfiles en memoria (compartidos por todas las sesiones
+# del worker). Con el modo desactivado profile_rerun devuelve un nullcontext
+# y profile_tab no hace nada: no se instala ningún profiler.
+
+import cProfile
+import marshal
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+PROFILE_CAPACITY = int(os.environ.get("PREITV_PROFILE_CAPACITY", 20))
+TOP_N = 25
+
+_enabled = os.environ.get("PREITV_PROFILING") == "1"
+# Un solo rerun perfilado a la vez por proceso: acota el sobrecoste y evita
+# profilers simultáneos (en Python 3.12+ cProfile no los admite)
+_capture_lock = threading.Lock()
+_local = threading.local()
+
+def is_enabled():
+    return _enabled
+
+def set_enabled(value):
+    global _enabled
+    _enabled = bool(value)
+
+class RerunProfile:
+    """Perfil de un rerun: estadísticas de cProfile y tiempo por pestaña."""
+    __slots__ = ("ts", "page", "role", "seconds", "tabs", "stats")
+
+    def __init__(self, page, role):
+        self.ts = time.time()
+        self.page = page
+        self.role = role
+        self.seconds = 0.0
+        self.tabs = {}
+        self.stats = None
+
+    @property
+    def tab(self):
+        """Pestaña en la que más tiempo se pasó (Streamlit pinta todas en cada rerun)."""
+        return max(self.tabs, key=self.tabs.get) if self.tabs else "-"
+
+    @property
+    def label(self):
+        hora = time.strftime("%H:%M:%S", time.localtime(self.ts))
+        return f"{hora} · {self.page} · {self.tab} · {self.role} · {self.seconds * 1000:.0f} ms"
+
+    def dump(self):
+        """Bytes en el formato de cProfile.dump_stats (pstats.Stats / snakeviz)."""
+        return marshal.dumps(self.stats)
+
+    def summary(self, n=TOP_N):
+        """Top-n funciones por tiempo acumulado."""
+        rows = []
+        for (filename, line, name), (_, calls, tottime, cumtime, _) in self.stats.items():
+            rows.append({
+                "función": f"{name} ({os.path.basename(filename)}:{line})",
+                "llamadas": calls,
+                "propio_ms": round(tottime * 1000, 1),
+                "acumulado_ms": round(cumtime * 1000, 1)
+            })
+        rows.sort(key=lambda r: r["acumulado_ms"], reverse=True)
+        return rows[:n]
+
+class ProfileStore:
+    """Últimos `capacity` perfiles, del más antiguo al más reciente."""
+
+    def __init__(self, capacity=PROFILE_CAPACITY):
+        self._items = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def add(self, profile):
+        with self._lock:
+            self._items.append(profile)
+
+    def list(self):
+        with self._lock:
+            return list(self._items)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+profiles = ProfileStore()
+
+@contextmanager
+def _capture(page, role):
+    profile = RerunProfile(page, role)
+    profiler = cProfile.Profile()
+    _local.current = profile
+    t0 = time.perf_counter()
+    profiler.enable()
+    try:
+        yield profile
+    finally:
+        profiler.disable()
+        profile.seconds = time.perf_counter() - t0
+        _local.current = None
+        _capture_lock.release()
+        profile.stats = pstats.Stats(profiler).stats
+        profiles.add(profile)
+
+def profile_rerun(page, role):
+    """
+    Contexto para el cuerpo de un rerun. Si el modo está activo (y no hay
+    otro rerun perfilándose) captura el perfil y lo guarda en `profiles`.
+    Solo se perfila el hilo del rerun: el trabajo en pools aparece como espera.
+    """
+    if not _enabled or not _capture_lock.acquire(blocking=False):
+        return nullcontext()
+    return _capture(page, role)
+
+@contextmanager
+def _tab(profile, name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.tabs[name] = profile.tabs.get(name, 0.0) + time.perf_counter() - t0
+
+def profile_tab(name):
+    """Anota el tiempo de una pestaña en el perfil en curso (si lo hay)."""
+    profile = getattr(_local, "current", None)
+    if profile is None:
+        return nullcontext()
+    return _tab(profile, name)
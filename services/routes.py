@@ -1,24 +1,155 @@
 # Módulo para cálculo de rutas y coste
 
-import requests
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from services import polyline
+from services.upstream import get_json
+
+OSRM_URL = os.environ.get("PREITV_OSRM_URL", "http://router.project-osrm.org")
+# Plazo máximo por petición de ruta a OSRM
+OSRM_DEADLINE_S = 5
+# Plazo para una matriz de distancias completa (/table)
+OSRM_TABLE_DEADLINE_S = 30
+
+# "osrm" usa el servidor remoto; "local" el grafo preprocesado de services/local_router
+ROUTING_BACKEND = os.environ.get("PREITV_ROUTING", "osrm")
+LOCAL_GRAPH_DIR = os.environ.get(
+    "PREITV_GRAPH_DIR", os.path.join(os.path.dirname(__file__), "..", "data", "road_graph")
+)
+
+# Precisión de la polyline que devuelve OSRM con geometries=polyline6
+ROUTE_POLYLINE_PRECISION = 6
+
+# Rutas de OSRM ya pedidas, guardadas como polyline (unos KB por ruta)
+ROUTE_CACHE_SIZE = int(os.environ.get("PREITV_ROUTE_CACHE_SIZE", "512"))
+_route_cache = OrderedDict()
+_route_cache_lock = threading.Lock()
+
+_local_router = None
+
+def _get_local_router():
+    global _local_router
+    if _local_router is None:
+        from services.local_router import LocalRouter
+        _local_router = LocalRouter(LOCAL_GRAPH_DIR)
+    return _local_router
+
+def _get_route_osrm(origin: tuple, destination: tuple):
+    lon_o, lat_o = origin
+    lon_d, lat_d = destination
+    url = f"{OSRM_URL}/route/v1/driving/{lon_o},{lat_o};{lon_d},{lat_d}?overview=full&geometries=polyline6"
+    data = get_json(url, OSRM_DEADLINE_S)
+    route = data["routes"][0]
+    return route["distance"], route["duration"], route["geometry"]
+
+def _get_route_osrm_cached(origin: tuple, destination: tuple):
+    """_get_route_osrm con caché LRU de la respuesta ya codificada."""
+    key = (tuple(origin), tuple(destination))
+    with _route_cache_lock:
+        if key in _route_cache:
+            _route_cache.move_to_end(key)
+            return _route_cache[key]
+    route = _get_route_osrm(origin, destination)
+    with _route_cache_lock:
+        _route_cache[key] = route
+        if len(_route_cache) > ROUTE_CACHE_SIZE:
+            _route_cache.popitem(last=False)
+    return route
+
+def _get_route_native(origin: tuple, destination: tuple):
+    """
+    (distancia_m, duracion_s, coordenadas, polyline) con la geometría solo en
+    la forma que da el backend (la otra es None): el motor local da
+    coordenadas y OSRM la polyline. Así no se codifica para luego decodificar.
+    """
+    if ROUTING_BACKEND == "local":
+        result = _get_local_router().route(origin, destination)
+        if result is None:
+            return None
+        distancia_m, duracion_s, coords = result
+        return distancia_m, duracion_s, np.asarray(coords, dtype=np.float64), None
+    distancia_m, duracion_s, encoded = _get_route_osrm_cached(origin, destination)
+    return distancia_m, duracion_s, None, encoded
+
+def _as_array(coords, encoded):
+    return coords if coords is not None else polyline.decode_array(encoded, ROUTE_POLYLINE_PRECISION)
+
+def _as_polyline(coords, encoded):
+    return encoded if encoded is not None else polyline.encode(coords.tolist(), ROUTE_POLYLINE_PRECISION)
 
 def get_route(origin: tuple, destination: tuple):
-    """Devuelve distancia, duración y coordenadas de línea entre dos puntos."""
+    """
+    Devuelve distancia, duración y coordenadas de línea entre dos puntos.
+    Las coordenadas son un array (n, 2) de [lon, lat].
+    """
+    try:
+        route = _get_route_native(origin, destination)
+        if route is None:
+            return None
+        distancia_m, duracion_s, coords, encoded = route
+        return distancia_m / 1000, duracion_s / 60, _as_array(coords, encoded)
+    except Exception as e:
+        return None
+
+def get_route_encoded(origin: tuple, destination: tuple):
+    """
+    Como get_route pero con la geometría codificada como polyline de
+    precisión ROUTE_POLYLINE_PRECISION (ver services/polyline.py), que es
+    la forma de guardar, cachear y transmitir rutas.
+    """
     try:
-        lon_o, lat_o = origin
-        lon_d, lat_d = destination
-        url = f"http://router.project-osrm.org/route/v1/driving/{lon_o},{lat_o};{lon_d},{lat_d}?overview=full&geometries=geojson"
-        res = requests.get(url)
-        res.raise_for_status()
-        data = res.json()
-        route = data["routes"][0]
-        distancia_m = route["distance"]
-        duracion_s = route["duration"]
-        coords = route["geometry"]["coordinates"]
-        return distancia_m / 1000, duracion_s / 60, coords
+        route = _get_route_native(origin, destination)
+        if route is None:
+            return None
+        distancia_m, duracion_s, coords, encoded = route
+        return distancia_m / 1000, duracion_s / 60, _as_polyline(coords, encoded)
     except Exception as e:
         return None
 
+def get_route_geometry(origin: tuple, destination: tuple):
+    """
+    Devuelve (distancia_km, duracion_min, coordenadas, polyline): el array
+    para calcular sobre la ruta y la polyline para guardarla en el historial.
+    """
+    try:
+        route = _get_route_native(origin, destination)
+        if route is None:
+            return None
+        distancia_m, duracion_s, coords, encoded = route
+        return (distancia_m / 1000, duracion_s / 60,
+                _as_array(coords, encoded), _as_polyline(coords, encoded))
+    except Exception as e:
+        return None
+
+def get_distance_matrix(points):
+    """
+    Distancias por carretera en km entre todos los puntos (lon, lat).
+    Con OSRM es una sola petición al servicio /table (sin geometrías); con el
+    motor local, una búsqueda por par. Devuelve un array (n, n) con NaN en los
+    pares sin ruta.
+    """
+    n = len(points)
+    if ROUTING_BACKEND == "local":
+        router = _get_local_router()
+        matrix = np.full((n, n), np.nan)
+        for i, origin in enumerate(points):
+            for j, destination in enumerate(points):
+                if i == j:
+                    matrix[i, j] = 0.0
+                    continue
+                result = router.route(origin, destination)
+                if result is not None:
+                    matrix[i, j] = result[0] / 1000
+        return matrix
+    coords = ";".join(f"{lon},{lat}" for lon, lat in points)
+    data = get_json(f"{OSRM_URL}/table/v1/driving/{coords}?annotations=distance", OSRM_TABLE_DEADLINE_S)
+    # OSRM devuelve null en los pares sin ruta (p. ej. península - islas)
+    return np.array([[np.nan if d is None else d / 1000 for d in row] for row in data["distances"]])
+
 def calcular_coste(distancia_km, consumo_l_100km, precio_l):
     litros = distancia_km * consumo_l_100km / 100
     coste = litros * precio_l
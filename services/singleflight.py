@@ -0,0 +1,21 @@
+# Coalescencia de peticiones idénticas concurrentes ("single-flight")
+
+import asyncio
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes con la misma clave: la primera lanza la
+    corrutina y el resto esperan su resultado (o su excepción).
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def do(self, key, fn, *args):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: si un cliente se desconecta no se cancela la llamada del resto
+        return await asyncio.shield(task)
@@ -2,6 +2,9 @@ from supabase import create_client
 import streamlit as st
 from typing import Optional
 
+from services import polyline
+from services.routes import ROUTE_POLYLINE_PRECISION
+
 # Credenciales desde secrets.toml
 SUPABASE_URL = st.secrets["SUPABASE_URL"]
 SUPABASE_KEY = st.secrets["SUPABASE_KEY"]
@@ -37,8 +40,14 @@ def save_search(user_id: Optional[str], city: str, results: dict):
         st.error(f"Error guardando búsqueda: {e}")
 
 def save_route(user_id: Optional[str], origin: str, destination: str,
-               distance_km: float, duration: str, consumption_l: float, cost: float):
-    """Guardar ruta y coste para usuarios registrados."""
+               distance_km: float, duration: str, consumption_l: float, cost: float,
+               geometry=None):
+    """
+    Guardar ruta y coste para usuarios registrados.
+    geometry: polyline ya codificada (str, de get_route_encoded) o
+    coordenadas [[lon, lat], ...], que se guardan codificadas con la misma
+    precisión (ROUTE_POLYLINE_PRECISION).
+    """
     if not user_id:
         return
     try:
@@ -52,6 +61,10 @@ def save_route(user_id: Optional[str], origin: str, destination: str,
                 "cost": cost
             }
         }
+        if geometry is not None:
+            if not isinstance(geometry, str):
+                geometry = polyline.encode(list(geometry), ROUTE_POLYLINE_PRECISION)
+            data["results"]["geometry"] = geometry
         supabase.table("searches").insert(data).execute()
     except Exception as e:
         st.error(f"Error guardando ruta: {e}")
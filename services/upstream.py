@@ -0,0 +1,185 @@
+# Cliente compartido para los servicios externos (OSRM, MITECO, FIPE)
+#
+# - Cada petición tiene un plazo total (deadline) que nunca se supera.
+# - Petición "hedged": si la primera no ha respondido al llegar al p95 de
+#   latencia observado para ese host (o ha fallado), se lanza una segunda y
+#   gana la primera que responda.
+# - Circuit breaker por host: tras varios fallos seguidos se deja de llamar
+#   durante un tiempo y se sirve la última respuesta buena (stale) si existe.
+# Solo cuentan como fallo los timeouts, errores de conexión y 5xx. Un 4xx es
+# una respuesta válida del host a una petición que no tiene solución (p. ej.
+# NoRoute de OSRM): se devuelve enseguida, sin segundo intento ni fallo.
+
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlsplit
+
+import requests
+
+class UpstreamError(Exception):
+    """El servicio externo no respondió a tiempo o está marcado como caído."""
+
+class UpstreamClientError(UpstreamError):
+    """El servicio respondió con un 4xx; repetir la petición no cambia nada."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+class CircuitBreaker:
+    """Cerrado -> abierto tras `failure_threshold` fallos seguidos; semiabierto tras `reset_timeout_s`."""
+
+    def __init__(self, failure_threshold=5, reset_timeout_s=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.failures = 0
+        self.open_until = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.failures < self.failure_threshold:
+            return "closed"
+        return "open" if time.monotonic() < self.open_until else "half-open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._probe_in_flight:
+                # Solo una petición de prueba mientras está semiabierto
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.failures >= self.failure_threshold:
+                self.open_until = time.monotonic() + self.reset_timeout_s
+
+class LatencyTracker:
+    """Latencias recientes de un host para estimar el p95."""
+
+    def __init__(self, window=200, min_samples=20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def p95(self):
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+class UpstreamClient:
+    """Cliente HTTP JSON con deadline, hedging, circuit breaker y caché stale."""
+
+    def __init__(self, failure_threshold=5, reset_timeout_s=30, stale_entries=256, max_workers=32):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.stale_entries = stale_entries
+        self._breakers = {}
+        self._latencies = {}
+        self._stale = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upstream")
+
+    def breaker(self, host):
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout_s)
+                self._latencies[host] = LatencyTracker()
+            return self._breakers[host]
+
+    def _fetch(self, url, deadline):
+        start = time.monotonic()
+        res = requests.get(url, timeout=max(deadline - start, 0.001))
+        if 400 <= res.status_code < 500:
+            raise UpstreamClientError(f"{urlsplit(url).netloc}: HTTP {res.status_code}", res.status_code)
+        res.raise_for_status()
+        return res.json(), time.monotonic() - start
+
+    def _hedged(self, url, host, deadline, hedge):
+        start = time.monotonic()
+        pending = {self._pool.submit(self._fetch, url, deadline)}
+        hedge_after = self._latencies[host].p95() if hedge else None
+        hedged = False
+        error = None
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            timeout = deadline - now
+            if not hedged and hedge_after is not None:
+                timeout = min(timeout, max(start + hedge_after - now, 0))
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for fut in done:
+                try:
+                    data, elapsed = fut.result()
+                    self._latencies[host].add(elapsed)
+                    return data
+                except UpstreamClientError:
+                    for other in pending:
+                        other.cancel()
+                    raise
+                except Exception as e:
+                    error = e
+            # Segundo intento (solo con hedge): al llegar al p95 o si el primero falló rápido
+            if hedge and not hedged and (hedge_after is not None or not pending) and time.monotonic() < deadline:
+                pending.add(self._pool.submit(self._fetch, url, deadline))
+                hedged = True
+        raise UpstreamError(f"{host}: sin respuesta en plazo ({error or 'timeout'})")
+
+    def get_json(self, url, deadline_s=5.0, hedge=True):
+        """
+        GET que devuelve el JSON de `url` en menos de `deadline_s` segundos.
+        Si el host falla o su circuito está abierto se devuelve la última
+        respuesta buena de esa URL; si no la hay se lanza UpstreamError.
+        """
+        host = urlsplit(url).netloc
+        breaker = self.breaker(host)
+        if not breaker.allow():
+            return self._stale_or_raise(url, UpstreamError(f"{host}: circuito abierto"))
+        try:
+            data = self._hedged(url, host, time.monotonic() + deadline_s, hedge)
+        except UpstreamClientError:
+            # El host está respondiendo: cuenta como éxito para el circuito
+            breaker.record_success()
+            raise
+        except Exception as e:
+            breaker.record_failure()
+            return self._stale_or_raise(url, e)
+        breaker.record_success()
+        with self._lock:
+            self._stale[url] = data
+            self._stale.move_to_end(url)
+            while len(self._stale) > self.stale_entries:
+                self._stale.popitem(last=False)
+        return data
+
+    def _stale_or_raise(self, url, error):
+        with self._lock:
+            if url in self._stale:
+                logging.warning(f"Sirviendo respuesta antigua para {url}: {error}")
+                return self._stale[url]
+        raise error if isinstance(error, UpstreamError) else UpstreamError(str(error))
+
+# Cliente único compartido por todas las sesiones del proceso
+upstream = UpstreamClient()
+
+def get_json(url, deadline_s=5.0, hedge=True):
+    return upstream.get_json(url, deadline_s, hedge)
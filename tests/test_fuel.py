@@ -0,0 +1,143 @@
+import random
+from math import radians, degrees, sin, cos, asin, atan2
+
+import pytest
+
+from services.fuel import (
+    haversine, filter_cheapest_on_route, filter_cheapest_on_route_multi, plan_refuel_stops, FUEL_TYPES
+)
+
+def baseline_cheapest_on_route(stations, route_coords, fuel_type, max_distance_km, limit):
+    """filter_cheapest_on_route original: recorre la ruta entera por estación."""
+    candidates = []
+    for st in stations:
+        try:
+            lat = float(st["Latitud"].replace(",", "."))
+            lon = float(st["Longitud (WGS84)"].replace(",", "."))
+            precio_str = st.get(f"Precio {fuel_type}")
+            if not precio_str or precio_str.strip() == "":
+                continue
+            precio = float(precio_str.replace(",", "."))
+            for lon_r, lat_r in route_coords:
+                if haversine(lon, lat, lon_r, lat_r) <= max_distance_km:
+                    candidates.append({
+                        "rotulo": st.get("Rótulo"),
+                        "direccion": st.get("Dirección"),
+                        "municipio": st.get("Municipio"),
+                        "precio": precio,
+                        "lat": lat,
+                        "lon": lon
+                    })
+                    break
+        except Exception:
+            continue
+    candidates.sort(key=lambda x: x["precio"])
+    return candidates[:limit]
+
+def destination(lon, lat, bearing, km):
+    """Punto a `km` de (lon, lat) con rumbo `bearing` (grados), sobre la esfera de haversine."""
+    lat1, lon1, b, d = radians(lat), radians(lon), radians(bearing), km / 6371
+    lat2 = asin(sin(lat1) * cos(d) + cos(lat1) * sin(d) * cos(b))
+    lon2 = lon1 + atan2(sin(b) * sin(d) * cos(lat1), cos(d) - sin(lat1) * sin(lat2))
+    return degrees(lon2), degrees(lat2)
+
+def _fmt(x):
+    return f"{x:.6f}".replace(".", ",")
+
+def random_case(rnd, max_distance_km, n_stations=300):
+    """Ruta aleatoria y estaciones repartidas cerca, en el borde del radio y lejos."""
+    lon, lat = rnd.uniform(-9, 3), rnd.uniform(36, 43.8)
+    route = []
+    for _ in range(rnd.randint(1, 60)):
+        route.append([round(lon, 6), round(lat, 6)])
+        lon, lat = destination(lon, lat, rnd.uniform(0, 360), rnd.uniform(0.2, 8))
+    stations = []
+    for i in range(n_stations):
+        lon_r, lat_r = rnd.choice(route)
+        kind = rnd.random()
+        if kind < 0.2:
+            lon_s, lat_s = lon_r, lat_r
+        elif kind < 0.6:
+            factor = rnd.choice([0.9999, 1.0001])
+            lon_s, lat_s = destination(lon_r, lat_r, rnd.choice([0, 90, 180, 270, rnd.uniform(0, 360)]),
+                                       factor * max_distance_km)
+        else:
+            lon_s, lat_s = destination(lon_r, lat_r, rnd.uniform(0, 360), rnd.uniform(0, 3 * max_distance_km + 1))
+        st = {"Rótulo": f"E{i}", "Dirección": f"Calle {i}", "Municipio": "X",
+              "Latitud": _fmt(lat_s), "Longitud (WGS84)": _fmt(lon_s)}
+        for fuel in FUEL_TYPES:
+            if rnd.random() < 0.8:
+                # Pocos precios distintos: muchos empates
+                st[f"Precio {fuel}"] = f"{rnd.choice([1.459, 1.499, 1.529, 1.599]):.3f}".replace(".", ",")
+            elif rnd.random() < 0.5:
+                st[f"Precio {fuel}"] = " "
+        stations.append(st)
+    return stations, route
+
+@pytest.mark.parametrize("seed", range(40))
+def test_cheapest_on_route_matches_baseline_scan(seed):
+    rnd = random.Random(seed)
+    max_distance_km = rnd.choice([0, 0.5, 2, 5, 10])
+    limit = rnd.choice([0, 1, 5, 20])
+    stations, route = random_case(rnd, max_distance_km)
+    for fuel in FUEL_TYPES:
+        expected = baseline_cheapest_on_route(stations, route, fuel, max_distance_km, limit)
+        assert filter_cheapest_on_route(stations, route, fuel, max_distance_km, limit) == expected
+
+@pytest.mark.parametrize("seed", range(10))
+def test_multi_fuel_matches_single_fuel(seed):
+    rnd = random.Random(1000 + seed)
+    stations, route = random_case(rnd, 5)
+    multi = filter_cheapest_on_route_multi(stations, route, FUEL_TYPES, 5, 5)
+    for fuel in FUEL_TYPES:
+        assert multi[fuel] == baseline_cheapest_on_route(stations, route, fuel, 5, 5)
+
+@pytest.mark.parametrize("lat", [36.5, 43.7])
+@pytest.mark.parametrize("max_distance_km", [2, 5])
+def test_corridor_keeps_stations_at_the_edge_of_the_radius(lat, max_distance_km):
+    """Estación al este u oeste a 0,9999 × radio, con el punto de ruta en cualquier posición de su celda."""
+    for i in range(5000):
+        lon = -3.7 + i * 2e-5
+        route = [[lon, lat]]
+        for bearing in (90, 270):
+            lon_s, lat_s = destination(lon, lat, bearing, 0.9999 * max_distance_km)
+            st = {"Latitud": str(lat_s), "Longitud (WGS84)": str(lon_s), "Precio Gasoleo A": "1,5"}
+            assert filter_cheapest_on_route([st], route, "Gasoleo A", max_distance_km, 1), (lon, bearing)
+
+def dp_refuel_cost(stations, route_km, tank_l, fuel_inicial_l):
+    """Coste mínimo con 1 L/km comprando litros enteros en cada estación (None si no se llega)."""
+    INF = float("inf")
+    best = {fuel_inicial_l: 0.0}
+    pos = 0
+    for st in stations + [{"km": route_km, "precio": None}]:
+        best = {f - (st["km"] - pos): c for f, c in best.items() if f >= st["km"] - pos}
+        pos = st["km"]
+        if st["precio"] is None or not best:
+            continue
+        nuevo = {}
+        for f, c in best.items():
+            for litros in range(tank_l - f + 1):
+                coste = c + litros * st["precio"]
+                if coste < nuevo.get(f + litros, INF):
+                    nuevo[f + litros] = coste
+        best = nuevo
+    return min(best.values()) if best else None
+
+@pytest.mark.parametrize("seed", range(300))
+def test_refuel_plan_matches_dp_without_detours(seed):
+    rnd = random.Random(seed)
+    route_km = rnd.randint(1, 60)
+    tank_l = rnd.randint(1, 20)
+    fuel_inicial_l = rnd.randint(0, tank_l)
+    kms = sorted(rnd.sample(range(route_km), rnd.randint(0, min(route_km, 8))))
+    stations = [{"km": km, "precio": rnd.choice([1.4, 1.5, 1.6, 1.7]), "desvio_km": 0.0} for km in kms]
+    # Ruta sobre el ecuador de route_km km: route_km_marks mide exactamente esa longitud
+    route = [[0.0, 0.0], [degrees(route_km / 6371), 0.0]]
+    plan = plan_refuel_stops(stations, route, tank_l, fuel_inicial_l, 100)
+    expected = dp_refuel_cost(stations, route_km, tank_l, fuel_inicial_l)
+    if expected is None:
+        assert plan is None
+    else:
+        assert plan is not None
+        assert plan["coste_total"] == pytest.approx(expected, abs=0.01)
+        assert sum(p["coste"] for p in plan["paradas"]) == pytest.approx(plan["coste_total"], abs=0.01 * len(kms) + 1e-9)
@@ -0,0 +1,41 @@
+import random
+
+import numpy as np
+import pytest
+
+from services import polyline
+
+def random_route(rnd, n, precision):
+    """Ruta [[lon, lat], ...] ya redondeada a la precisión, con saltos grandes y pequeños."""
+    lon, lat = rnd.uniform(-180, 180), rnd.uniform(-90, 90)
+    coords = []
+    for _ in range(n):
+        coords.append([round(lon, precision), round(lat, precision)])
+        step = rnd.choice([1e-5, 1e-3, 0.1, 10])
+        lon = min(180, max(-180, lon + rnd.uniform(-step, step)))
+        lat = min(90, max(-90, lat + rnd.uniform(-step, step)))
+    return coords
+
+@pytest.mark.parametrize("precision", [5, 6])
+@pytest.mark.parametrize("seed", range(50))
+def test_round_trip(seed, precision):
+    rnd = random.Random(seed)
+    coords = random_route(rnd, rnd.randint(1, 500), precision)
+    encoded = polyline.encode(coords, precision)
+    np.testing.assert_allclose(polyline.decode(encoded, precision), coords, rtol=0, atol=1e-9)
+    decoded = polyline.decode_array(encoded, precision)
+    assert decoded.shape == (len(coords), 2)
+    np.testing.assert_array_equal(decoded, np.array(polyline.decode(encoded, precision)))
+    assert polyline.decode_array(encoded.encode("ascii"), precision).tolist() == decoded.tolist()
+
+def test_known_value():
+    # Ejemplo de la documentación del formato (lat, lon)
+    encoded = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert polyline.decode(encoded) == [[-120.2, 38.5], [-120.95, 40.7], [-126.453, 43.252]]
+    assert polyline.encode([[-120.2, 38.5], [-120.95, 40.7], [-126.453, 43.252]]) == encoded
+
+def test_empty_and_incomplete():
+    assert polyline.encode([]) == ""
+    assert polyline.decode_array("").shape == (0, 2)
+    with pytest.raises(ValueError):
+        polyline.decode_array("_p~iF~ps|U_ulL")
@@ -1,4 +1,5 @@
 import streamlit as st
+from utils.cities import ciudades_coords
 
 def local_css(file_name):
     """Carga un archivo CSS local para personalizar la app."""
@@ -9,6 +10,15 @@ def local_css(file_name):
         st.warning(f"No se pudo cargar CSS: {e}")
 
 
+def geocode_city(city_name: str):
+    """Devuelve coordenadas (lat, lon) desde ciudades_coords."""
+    coords = ciudades_coords.get(city_name)
+    if coords:
+        return coords
+    st.error(f"No se encontraron coordenadas para {city_name}")
+    return None
+
+
 def resumen_proximos_mantenimientos(km):
     """Devuelve un resumen básico de próximos mantenimientos según km."""
     resumen = "Próximos mantenimientos recomendados:\n"